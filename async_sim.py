@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import codecs
+
+import cpu_sim
+from ports import InputPort, OutputPort
+
+
+class InputPendingError(BlockingIOError):
+    """IN found no buffered input; the task awaits more and retries the same microinstruction."""
+
+
+class AsyncInputPort(InputPort):
+    """IN device fed by an async iterable of text chunks.
+
+    ``read`` never blocks: with the buffer drained it raises ``InputPendingError`` before the
+    microinstruction has changed anything, and ``refill`` awaits the next chunk. The stream
+    ends (and IN halts the machine, as with a file) when the iterable is exhausted.
+    """
+
+    def __init__(self, chunks):
+        super().__init__(stream=None)
+        self.chunks = aiter(chunks)
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        raise InputPendingError
+
+    async def refill(self):
+        chunk = await anext(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+        else:
+            self.buf = self.buf[self.pos:] + chunk
+            self.pos = 0
+
+
+class AsyncOutputPort(OutputPort):
+    """OUT device collecting words; ``flush`` hands the ones not sent yet to an async ``sink(words)``."""
+
+    def __init__(self, sink):
+        super().__init__(echo=False)
+        self.sink = sink
+        self.sent = 0
+
+    async def flush(self):
+        if self.values is not None and self.sent < len(self.values):
+            words = self.values[self.sent:]
+            self.sent = len(self.values)
+            await self.sink(words)
+
+
+async def run_async(cpu, chunks, sink, slice_ticks=10_000):
+    """Run ``cpu`` as a cooperative task: it yields to the event loop every ``slice_ticks`` ticks and while IN waits.
+
+    Output is flushed to ``sink`` at every yield, so a prompt reaches the client before the task waits for the answer.
+    """
+    cpu.in_port = AsyncInputPort(chunks)
+    cpu.out_port = out_port = AsyncOutputPort(sink)
+    r = cpu.registers
+    while not r.halted:
+        try:
+            cpu.run_until(r.macro_cnt + slice_ticks)
+        except InputPendingError:
+            await out_port.flush()
+            await cpu.in_port.refill()
+            continue
+        await out_port.flush()
+        await asyncio.sleep(0)
+    await out_port.flush()
+    cpu.finish()
+    return cpu
+
+
+async def stream_chunks(reader, size=4096):
+    """Text chunks of an ``asyncio.StreamReader``; UTF-8 sequences split between reads are kept whole."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while data := await reader.read(size):
+        yield decoder.decode(data)
+    yield decoder.decode(b"", final=True)
+
+
+async def serve(bin_path, host="127.0.0.1", port=8765, slice_ticks=10_000):
+    """Every TCP connection runs a fresh copy of the program with the socket as its IN and OUT."""
+    instr_mem, data_mem = cpu_sim.load_binary(bin_path)
+
+    async def session(reader, writer):
+        async def sink(words):
+            writer.write("".join(map(chr, words)).encode("utf-8"))
+            await writer.drain()
+
+        cpu = cpu_sim.CPU(instr_mem, data_mem, log_path=None, trace_level="off")
+        try:
+            await run_async(cpu, stream_chunks(reader), sink, slice_ticks)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    server = await asyncio.start_server(session, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a program over TCP, one simulated machine per connection")
+    parser.add_argument("bin_path", help="binary to run for every connection")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--slice", type=int, default=10_000, help="ticks a machine runs before yielding")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.bin_path, args.host, args.port, args.slice))
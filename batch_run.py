@@ -0,0 +1,167 @@
+import argparse
+import importlib
+import json
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import cpu_sim
+from data_memory import DataImage
+
+# ticks a run may take before it is reported as "timeout": one program that never halts must not hold up the batch
+TICK_BUDGET = 100_000_000
+VECTOR_INSTALL_HINT = "--mode=vector needs NumPy: poetry install --extras vector"
+
+_images: "dict[str, tuple[array[int], DataImage] | str]" = {}
+
+
+class MissingNumpyError(ImportError):
+    """``vector`` mode was asked for, but the optional NumPy dependency is not installed."""
+
+
+def require_numpy():
+    try:
+        importlib.import_module("numpy")
+    except ImportError as e:
+        raise MissingNumpyError(VECTOR_INSTALL_HINT) from e
+
+
+def read_manifest(path):
+    """Manifest is JSON lines: ``{"program": "a.bin", "input": "a.txt"}``; paths are relative to the manifest."""
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            program = os.path.join(base, entry["program"])
+            input_path = os.path.join(base, entry["input"]) if entry.get("input") else None
+            jobs.append((program, input_path))
+    return jobs
+
+
+def error_status(e):
+    return f"error: {type(e).__name__}: {e}"
+
+
+def load_images(programs):
+    images = {}
+    for program in programs:
+        try:
+            images[program] = cpu_sim.load_binary(program)
+        except Exception as e:  # a missing or malformed binary fails only its own jobs
+            images[program] = error_status(e)
+    return images
+
+
+def _init_worker(images):
+    _images.update(images)
+
+
+def job_result(job):
+    program, input_path = job
+    return {"program": program, "input": input_path, "status": "ok", "ticks": 0, "output": None}
+
+
+def run_job(job, mode="fast", max_ticks=TICK_BUDGET):
+    program, input_path = job
+    result = job_result(job)
+    image = _images[program]
+    if isinstance(image, str):
+        result["status"] = image
+        return result
+    instr_mem, data_mem = image
+    try:
+        cpu = cpu_sim.engine_class(mode)(instr_mem, data_mem, log_path=None, input_path=input_path,
+                                         trace_level="off")
+        cpu.out_port.echo = False
+        cpu.run(max_ticks)
+    except Exception as e:  # whatever goes wrong stays with this job, the rest of the batch keeps running
+        result["status"] = error_status(e)
+        return result
+    if not cpu.registers.halted:
+        result["status"] = "timeout"
+    result["ticks"] = cpu.registers.macro_cnt
+    result["output"] = cpu.output_buffer
+    return result
+
+
+def run_lockstep(jobs, image, results, max_ticks=TICK_BUDGET):
+    """Run all ``jobs`` of one program as a single ``VectorCPU`` and fill in their ``results``."""
+    from vector_sim import VectorCPU
+
+    if isinstance(image, str):
+        for result in results:
+            result["status"] = image
+        return
+    instr_mem, data_mem = image
+    cpu = VectorCPU(instr_mem, data_mem, [input_path for _, input_path in jobs])
+    cpu.run(max_ticks)
+    for row, result in enumerate(results):
+        if row in cpu.errors:
+            result["status"] = error_status(cpu.errors[row])
+            continue
+        if cpu.timed_out[row]:
+            result["status"] = "timeout"
+        result["ticks"] = int(cpu.registers.macro_cnt[row])
+        result["output"] = cpu.output_buffers[row]
+
+
+def run_vector(jobs, images, max_ticks=TICK_BUDGET):
+    """``vector`` mode: the jobs of every program run in lockstep in this process; results keep manifest order."""
+    results = [job_result(job) for job in jobs]
+    by_program: dict[str, list[int]] = {}
+    for idx, (program, _) in enumerate(jobs):
+        by_program.setdefault(program, []).append(idx)
+    for program, idxs in by_program.items():
+        try:
+            run_lockstep([jobs[idx] for idx in idxs], images[program], [results[idx] for idx in idxs], max_ticks)
+        except Exception as e:
+            for idx in idxs:
+                results[idx]["status"] = error_status(e)
+    return results
+
+
+def run_batch(jobs, mode="fast", workers=None, max_ticks=TICK_BUDGET):
+    """Load every program once, then fan the runs out over a process pool; results keep manifest order."""
+    images = load_images(sorted({program for program, _ in jobs}))
+    if mode == "vector":
+        require_numpy()
+        yield from run_vector(jobs, images, max_ticks)
+        return
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(images,)) as pool:
+        yield from pool.map(run_job, jobs, [mode] * len(jobs), [max_ticks] * len(jobs), chunksize=chunksize)
+
+
+def main(manifest_path, results_path, mode="fast", workers=None, max_ticks=TICK_BUDGET):
+    if mode == "vector":
+        require_numpy()
+    jobs = read_manifest(manifest_path)
+    failed = 0
+    with open(results_path, "w", encoding="utf-8") as out:
+        for result in run_batch(jobs, mode, workers, max_ticks):
+            failed += result["status"] != "ok"
+            out.write(json.dumps(result) + "\n")
+    print(f"{len(jobs)} runs, {failed} failed -> {results_path}")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many (program, input) pairs on a process pool")
+    parser.add_argument("manifest", help="JSON lines with program and input paths")
+    parser.add_argument("results", help="JSON lines with status, ticks and output per run")
+    parser.add_argument("--mode", choices=["mc", "fast", "block", "vector"], default="fast",
+                        help="vector: all runs of a program in lockstep on NumPy arrays (no process pool)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--max-ticks", type=int, default=TICK_BUDGET,
+                        help="ticks a run may take before it is stopped with status timeout")
+    args = parser.parse_args()
+
+    try:
+        failed = main(args.manifest, args.results, args.mode, args.jobs, args.max_ticks)
+    except MissingNumpyError as e:
+        parser.error(str(e))
+    raise SystemExit(1 if failed else 0)
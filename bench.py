@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import cpu_sim
+import expr_to_asm
+from tracer import RECORD, TRACE_MAGIC
+
+LISP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lisp")
+BENCH_INPUT = "Alice\nShe was a fairy\n"
+THROUGHPUT_METRICS = ("ticks_per_s", "instructions_per_s")
+
+# Synthetic workloads scaled by size: an arithmetic loop and a loop of calls.
+SYNTHETIC = {
+    "loop": """(var i 1)
+(var sum 0)
+(var tmp 0)
+(while (< i {size}) (
+  (set tmp (* i i))
+  (set sum (+ sum tmp))
+  (set i (+ i 1))
+))
+(print_string sum)
+""",
+    "calls": """(defunc step (x) (
+  (var y 0)
+  (set y (* x 3))
+  (set y (+ y x))
+))
+(var i 0)
+(while (< i {size}) (
+  (funcall step (i))
+  (set i (+ i 1))
+))
+(print_string i)
+""",
+}
+
+
+def lisp_workloads():
+    for path in sorted(Path(LISP_DIR).glob("*/*.lisp")):
+        yield path.stem, path.read_text(encoding="utf-8")
+
+
+def synthetic_workloads(sizes):
+    for name, template in SYNTHETIC.items():
+        for size in sizes:
+            yield f"{name}_{size}", template.format(size=size)
+
+
+def compile_source(source_path, target, repeat=1):
+    """Compile ``repeat`` times and return the best wall time in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        expr_to_asm.main(source_path, target)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def count_instructions(target, input_path, log_path):
+    """Macro instructions executed, taken from the FETCH records of a binary macro trace."""
+    instr_mem, data_mem = cpu_sim.load_binary(target)
+    cpu = cpu_sim.engine_class("fast")(instr_mem, data_mem, log_path=log_path, input_path=input_path,
+                                       trace_level="macro", trace_format="binary")
+    cpu.out_port.echo = False
+    cpu.run()
+    with open(log_path, "rb") as f:
+        return (os.fstat(f.fileno()).st_size - len(TRACE_MAGIC)) // RECORD.size
+
+
+def run_engine(target, input_path, mode, trace_level, log_path):
+    """Run once in the current process; meant to be called in a fresh worker so peak RSS is per run."""
+    instr_mem, data_mem = cpu_sim.load_binary(target)
+    cpu = cpu_sim.engine_class(mode)(instr_mem, data_mem, log_path=log_path, input_path=input_path,
+                                     trace_level=trace_level)
+    cpu.out_port.echo = False
+    start = time.perf_counter()
+    cpu.run()
+    elapsed = time.perf_counter() - start
+    return elapsed, cpu.registers.macro_cnt, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(target, input_path, mode, trace_level, log_path, repeat=1):
+    best = None
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            run = pool.submit(run_engine, target, input_path, mode, trace_level, log_path).result()
+        if best is None or run[0] < best[0]:
+            best = run
+    return best
+
+
+def bench_workload(name, source, tmpdir, engines, repeat):
+    source_path = os.path.join(tmpdir, f"{name}.lisp")
+    target = os.path.join(tmpdir, f"{name}.bin")
+    input_path = os.path.join(tmpdir, "input.txt")
+    log_path = os.path.join(tmpdir, "trace.log")
+    with open(source_path, "w", encoding="utf-8") as f:
+        f.write(source)
+    with open(input_path, "w", encoding="utf-8") as f:
+        f.write(BENCH_INPUT)
+
+    compile_s = compile_source(source_path, target, repeat)
+    instructions = count_instructions(target, input_path, log_path)
+    for mode in engines:
+        for trace_level in cpu_sim.engine_class(mode).TRACE_LEVELS:
+            elapsed, ticks, rss = measure(target, input_path, mode, trace_level, log_path, repeat)
+            yield {
+                "workload": name,
+                "engine": mode,
+                "trace_level": trace_level,
+                "compile_s": compile_s,
+                "run_s": elapsed,
+                "ticks": ticks,
+                "instructions": instructions,
+                "ticks_per_s": ticks / elapsed,
+                "instructions_per_s": instructions / elapsed,
+                "peak_rss_kb": rss,
+            }
+
+
+def run_suite(sizes=(1000, 10000), engines=("mc", "fast", "block"), repeat=1, lisp=True):
+    workloads = list(lisp_workloads()) if lisp else []
+    workloads += synthetic_workloads(sizes)
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, source in workloads:
+            for row in bench_workload(name, source, tmpdir, engines, repeat):
+                print(format_row(row))
+                results.append(row)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def format_row(row):
+    return (f"{row['workload']:<20} {row['engine']:<6} {row['trace_level']:<6} "
+            f"compile {row['compile_s'] * 1000:8.2f} ms  {row['ticks_per_s']:12.0f} ticks/s  "
+            f"{row['instructions_per_s']:12.0f} instr/s  {row['peak_rss_kb']:8d} KiB")
+
+
+def result_key(row):
+    return row["workload"], row["engine"], row["trace_level"]
+
+
+def check_regressions(baseline, current, threshold):
+    """Return a message for every throughput metric that fell by more than ``threshold`` (0.1 = 10%)."""
+    base = {result_key(row): row for row in baseline["results"]}
+    regressions = []
+    for row in current["results"]:
+        old = base.get(result_key(row))
+        if old is None:
+            continue
+        for metric in THROUGHPUT_METRICS:
+            drop = 1 - row[metric] / old[metric]
+            if drop > threshold:
+                regressions.append(f"{'/'.join(result_key(row))}: {metric} {old[metric]:.0f} -> "
+                                   f"{row[metric]:.0f} (-{drop:.0%})")
+    return regressions
+
+
+def main(results_path, baseline_path=None, threshold=0.2, sizes=(1000, 10000), engines=("mc", "fast", "block"),
+         repeat=1):
+    report = run_suite(sizes, engines, repeat)
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if baseline_path is None:
+        return []
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = check_regressions(baseline, report, threshold)
+    for line in regressions:
+        print("REGRESSION", line)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compiler and simulator throughput benchmarks")
+    parser.add_argument("results", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed throughput drop, 0.2 = 20%%")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="synthetic workload sizes")
+    parser.add_argument("--engines", nargs="+", choices=["mc", "fast", "block"], default=["mc", "fast", "block"])
+    parser.add_argument("--repeat", type=int, default=1, help="keep the best of N runs")
+    args = parser.parse_args()
+
+    sys.exit(1 if main(args.results, args.baseline, args.threshold, args.sizes, args.engines, args.repeat) else 0)
@@ -0,0 +1,90 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from data_memory import DataImage
+
+# Binary v2, all fields big-endian:
+#   header      magic, version, number of text words, number of data segments
+#   text        one word per instruction: opcode(5 bits) | argument(27 bits)
+#   segments    base address, number of words, then the words themselves as signed 64-bit cells,
+#               the width of DataMemory cells; a gap in the data section starts a new segment
+# v1 files (word count, text, then (address, value) pairs until EOF) are still read.
+MAGIC = b"ACPU"
+VERSION = 2
+HEADER = struct.Struct(">4sIII")
+SEGMENT = struct.Struct(">II")
+V1_COUNT = struct.Struct(">I")
+V1_RECORD = struct.Struct(">Ii")
+
+
+class UnsupportedBinaryError(ValueError):
+    """Binary carries the v2 magic but a version this loader does not know."""
+
+
+class TruncatedBinaryError(ValueError):
+    """Binary ends before its header or the sections the header announces."""
+
+
+def require(view, end):
+    if end > len(view):
+        raise TruncatedBinaryError(end, len(view))
+
+
+def write_image(f, words, data):
+    """Data segments are the runs of ``DataImage.from_pairs``, the same split v1 data gets on load."""
+    runs = DataImage.from_pairs(data.items()).runs
+    f.write(HEADER.pack(MAGIC, VERSION, len(words), len(runs)))
+    f.write(struct.pack(f">{len(words)}I", *words))
+    for base, values in runs:
+        f.write(SEGMENT.pack(base, len(values)))
+        f.write(struct.pack(f">{len(values)}q", *values))
+
+
+def words_at(view, offset, count, typecode):
+    """``count`` big-endian words at ``offset`` as a native array."""
+    words = array(typecode)
+    require(view, offset + words.itemsize * count)
+    words.frombytes(view[offset:offset + words.itemsize * count])
+    if sys.byteorder == "little":
+        words.byteswap()
+    return words
+
+
+def read_v1(view):
+    require(view, V1_COUNT.size)
+    count = V1_COUNT.unpack_from(view, 0)[0]
+    offset = V1_COUNT.size + 4 * count
+    end = offset + (len(view) - offset) // V1_RECORD.size * V1_RECORD.size
+    pairs = V1_RECORD.iter_unpack(view[offset:end].tobytes())
+    return words_at(view, V1_COUNT.size, count, "I"), DataImage.from_pairs(pairs)
+
+
+def read_v2(view):
+    require(view, HEADER.size)
+    _, version, count, segments = HEADER.unpack_from(view, 0)
+    if version != VERSION:
+        raise UnsupportedBinaryError(version)
+    offset = HEADER.size + 4 * count
+    runs = []
+    for _ in range(segments):
+        require(view, offset + SEGMENT.size)
+        base, length = SEGMENT.unpack_from(view, offset)
+        offset += SEGMENT.size
+        runs.append((base, words_at(view, offset, length, "q")))
+        offset += 8 * length
+    return words_at(view, HEADER.size, count, "I"), DataImage(runs)
+
+
+def read_image(path):
+    """Map the file and return ``(instruction words, DataImage)``; words are copied straight out of the mapping."""
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            # mmap refuses an empty file with a bare ValueError
+            raise TruncatedBinaryError(V1_COUNT.size, 0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            if view[:len(MAGIC)] == MAGIC:
+                return read_v2(view)
+            return read_v1(view)
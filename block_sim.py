@@ -0,0 +1,301 @@
+import math
+
+from cpu_sim import ALU_OPS
+from data_memory import DataMemory
+from fast_sim import MASK, FastCPU
+from instrucrions import OPCODE_TABLE
+
+OPCODE_NAMES = {opcode: name for name, opcode in OPCODE_TABLE.items()}
+
+BODY_TEMPLATES = {
+    "load": ("da = {a}", "dr = d.get({a}, 0)", "acc = dr & M"),
+    "store": ("da = {a}", "d[{a}] = acc"),
+    "add": ("da = {a}", "dr = d.get({a}, 0)", "acc = (acc + dr) & M"),
+    "sub": ("da = {a}", "dr = d.get({a}, 0)", "acc = (acc - dr) & M"),
+    "mul": ("da = {a}", "dr = d.get({a}, 0)", "acc = (acc * dr) & M"),
+    "div": ("da = {a}", "dr = d.get({a}, 0)", "acc = div(acc, dr) & M"),
+    "push": ("sp = (sp - 1) & M", "da = sp", "d[sp] = acc"),
+    "pop": ("da = sp", "dr = d.get(sp, 0)", "acc = dr & M", "sp = (sp + 1) & M"),
+    "load_addr": ("da = {a}", "dr = d.get({a}, 0)", "da = dr & M", "dr = d.get(da, 0)", "acc = dr & M"),
+    "store_addr": ("da = {a}", "dr = d.get({a}, 0)", "da = dr & M", "d[da] = acc"),
+    "out": ("emit(acc)",),
+    "load_imm": ("acc = {a} & M",),
+    "add_imm": ("acc = (acc + {a}) & M",),
+    "sub_imm": ("acc = (acc - {a}) & M",),
+    "mul_imm": ("acc = (acc * {a}) & M",),
+    "div_imm": ("acc = div(acc, {a}) & M",),
+}
+
+BRANCH_CONDITIONS = {
+    "jz": "z == 1",
+    "jnz": "z == 0",
+    "jlt": "n == 1 and z != 0",
+    "jgt": "n == 0 and z != 0",
+}
+
+TERMINATORS = {"jmp", "call", "ret", "halt", *BRANCH_CONDITIONS}
+
+LOCALS = (("acc", "ACC"), ("sp", "SP"), ("dr", "DR"), ("da", "DataA"))
+
+MAX_BLOCK_LEN = 256
+
+
+def decode_arg(word):
+    arg = word & 0x07FFFFFF
+    return arg - (1 << 27) if arg & (1 << 26) else arg
+
+
+class TextMemory(list[int]):
+    """Instruction memory that reports writes so translated blocks can be dropped."""
+
+    def __init__(self, words, on_write):
+        super().__init__(words)
+        self.on_write = on_write
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self.on_write(index if isinstance(index, int) and index >= 0 else None)
+
+
+def _flushing(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args):
+        result = method(self, *args)
+        self.on_write(None)
+        return result
+
+    return wrapper
+
+
+for _name in ("__delitem__", "__iadd__", "__imul__", "append", "extend", "insert", "pop", "remove", "clear",
+              "sort", "reverse"):
+    setattr(TextMemory, _name, _flushing(_name))
+
+
+class Block:
+    def __init__(self, start, end, fn, targets, last, source):
+        self.start = start
+        self.end = end
+        self.fn = fn
+        self.targets = targets
+        self.last = last
+        self.links = [None] * len(targets)
+        self.stale = False
+        self.source = source
+
+
+class BlockTranslator:
+    def __init__(self, cpu, start):
+        self.cpu = cpu
+        self.start = start
+        self.lines = []
+        self.assigned = set()
+        self.acc_written = False
+        self.ticks = 0
+        self.targets = []
+        self.last = []
+        data = cpu.memory.data
+        self.static_len = len(data.static) if isinstance(data, DataMemory) else 0
+        self.traced = cpu.trace_fetch is not None
+
+    def emit(self, line, indent=1):
+        self.lines.append("    " * indent + line)
+        lhs = line.split(" = ")[0] if " = " in line else ""
+        if lhs in dict(LOCALS):
+            self.assigned.add(lhs)
+        if lhs == "acc":
+            self.acc_written = True
+
+    def write_back(self, ip, word, ticks, pad):
+        """Registers as the machine holds them once the block has run up to ``ip``, charged ``ticks``."""
+        for local, reg in LOCALS:
+            if local in self.assigned:
+                self.lines.append(f"{pad}r.{reg} = {local}")
+        if self.acc_written:
+            self.lines.append(f"{pad}r.Z = 1 if acc == 0 else 0")
+            self.lines.append(f"{pad}r.N = acc >> 31")
+        self.lines.append(f"{pad}r.IP = {ip}")
+        self.lines.append(f"{pad}r.IR = {word}")
+        self.lines.append(f"{pad}r.ARG = {decode_arg(word)}")
+        self.lines.append(f"{pad}r.macro_cnt += {ticks}")
+
+    def exit(self, ip, word, opcode, taken, ticks, target, indent=1, halted=False):
+        pad = "    " * indent
+        self.write_back(ip, word, ticks, pad)
+        if halted:
+            self.lines.append(f"{pad}r.halted = True")
+        self.lines.append(f"{pad}return {len(self.targets)}")
+        self.targets.append(target)
+        self.last.append((opcode, taken))
+
+    def translate(self):
+        instr = self.cpu.memory.instr
+        ip = self.start
+        while True:
+            word = instr[ip]
+            opcode = (word >> 27) & 0x1F
+            name = OPCODE_NAMES.get(opcode)
+            if self.traced:
+                self.emit(f"tf(r.macro_cnt + {self.ticks + 1}, {ip}, {word})")
+            if name is None:
+                self._fallback(ip, word, opcode)
+                return ip + 1
+            if name in TERMINATORS:
+                self._terminator(name, ip, word, opcode)
+                return ip + 1
+            self._body(name, ip, word, opcode)
+            ip += 1
+            if ip >= len(instr) or ip in self.cpu.leaders or ip - self.start >= MAX_BLOCK_LEN:
+                self.exit(ip, word, opcode, False, self.ticks, ip)
+                return ip
+
+    def _body(self, name, ip, word, opcode):
+        self.ticks += self.cpu.ticks[opcode][0]
+        if name == "in":
+            self.emit("ch = read()")
+            self.emit("if ch is not None:")
+            self.emit("acc = ch", 2)
+            self.emit("else:")
+            self.exit((ip + 1) & MASK, word, opcode, False, self.ticks, None, indent=2, halted=True)
+            return
+        arg = decode_arg(word)
+        for line in BODY_TEMPLATES[name]:
+            line = line.format(a=arg)
+            if 0 <= arg < self.static_len:
+                line = line.replace(f"d.get({arg}, 0)", f"s[{arg}]").replace(f"d[{arg}]", f"s[{arg}]")
+            self.emit(line)
+
+    def _terminator(self, name, ip, word, opcode):
+        arg = decode_arg(word)
+        not_taken, taken = self.cpu.ticks[opcode]
+        target = (ip + arg) & MASK
+        if name in BRANCH_CONDITIONS:
+            self._flags()
+            self.emit(f"if {BRANCH_CONDITIONS[name]}:")
+            acc_written = self.acc_written
+            self.emit(f"acc = {ip}", 2)
+            self.exit(target, word, opcode, True, self.ticks + taken, target, indent=2)
+            self.acc_written = acc_written
+            self.exit(ip + 1, word, opcode, False, self.ticks + not_taken, ip + 1)
+        elif name == "ret":
+            for line in ("da = sp", "dr = d.get(sp, 0)", "sp = (sp + 1) & M"):
+                self.emit(line)
+            self.exit("dr & M", word, opcode, False, self.ticks + not_taken, None)
+        elif name == "halt":
+            self.exit(ip, word, opcode, False, self.ticks + not_taken, None, halted=True)
+        else:
+            if name == "call":
+                for line in ("sp = (sp - 1) & M", "da = sp", f"d[sp] = {(ip + 1) & MASK}"):
+                    self.emit(line)
+            self.emit(f"acc = {ip}")
+            self.exit(target, word, opcode, True, self.ticks + taken, target)
+
+    def _flags(self):
+        if self.acc_written:
+            self.emit("z = 1 if acc == 0 else 0")
+            self.emit("n = acc >> 31")
+        else:
+            self.emit("z = r.Z")
+            self.emit("n = r.N")
+
+    def _fallback(self, ip, word, opcode):
+        # the microprogram runs on the registers, so everything the block did so far goes back first
+        self.write_back(ip, word, self.ticks + 1, "    ")
+        self.emit("cpu._op_microcoded(r)")
+        self.emit("return 0")
+        self.targets.append(None)
+        self.last.append((opcode, False))
+
+    def source(self):
+        prologue = [f"def block_{self.start}(r, d, cpu):", "    acc = r.ACC", "    sp = r.SP",
+                    "    read = cpu.in_port.read", "    emit = cpu.out_port.write"]
+        if self.static_len:
+            prologue.append("    s = d.static")
+        if self.traced:
+            prologue.append("    tf = cpu.trace_fetch")
+        return "\n".join(prologue + self.lines) + "\n"
+
+
+class BlockCPU(FastCPU):
+    """Engine that translates basic blocks of ``Memory.instr`` into Python functions.
+
+    Blocks start at jump/call targets, end at control transfers and are charged
+    their precomputed microprogram ticks, so the final state matches ``CPU``.
+    Without a cache, constant addresses inside the static data segment are
+    accessed as direct array indexes. A profiled run uses the instruction-level
+    loop of ``FastCPU``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.memory.instr = TextMemory(self.memory.instr, self.invalidate)
+        self.blocks = {}
+        self.leaders = set()
+        self.find_leaders()
+
+    def find_leaders(self):
+        self.leaders = {0}
+        for ip, word in enumerate(self.memory.instr):
+            name = OPCODE_NAMES.get((word >> 27) & 0x1F)
+            if name in TERMINATORS:
+                self.leaders.add(ip + 1)
+                if name not in ("ret", "halt"):
+                    self.leaders.add((ip + decode_arg(word)) & MASK)
+
+    def invalidate(self, addr=None):
+        for start, block in list(self.blocks.items()):
+            if addr is None or block.start <= addr < block.end:
+                block.stale = True
+                del self.blocks[start]
+        self.find_leaders()
+
+    def translate(self, start):
+        translator = BlockTranslator(self, start)
+        end = translator.translate()
+        source = translator.source()
+        namespace = {"M": MASK, "div": ALU_OPS[3]}
+        exec(compile(source, f"<block {start}>", "exec"), namespace)
+        block = Block(start, end, namespace[f"block_{start}"], translator.targets, translator.last, source)
+        self.blocks[start] = block
+        return block
+
+    def lookup(self, ip):
+        if ip >= len(self.memory.instr):
+            self.registers.halted = True
+            return None
+        block = self.blocks.get(ip)
+        return block if block is not None else self.translate(ip)
+
+    def restore(self, snap):
+        super().restore(snap)
+        self.invalidate()
+
+    def run(self, limit=math.inf):
+        if self.profile is not None:
+            # Profiling counts every instruction, which the translated blocks skip.
+            super().run(limit)
+            return
+        self.finish_microprogram()
+        r = self.registers
+        data = self.memory.data
+        last = None
+        block = None if r.halted else self.lookup(r.IP)
+        while block is not None:
+            slot = block.fn(r, data, self)
+            last = block.last[slot]
+            if r.halted or r.macro_cnt >= limit:
+                break
+            block = self._follow(block, slot)
+        self.fetch_pending = not r.halted
+        self._sync_upc(last)
+        if r.halted:
+            self.finish()
+
+    def _follow(self, block, slot):
+        if block.targets[slot] is None:
+            return self.lookup(self.registers.IP)
+        nxt = block.links[slot]
+        if nxt is None or nxt.stale:
+            nxt = block.links[slot] = self.lookup(block.targets[slot])
+        return nxt
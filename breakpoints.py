@@ -0,0 +1,78 @@
+from collections.abc import Callable
+
+
+class Breakpoints:
+    """What ``CPU.run_until`` stops on.
+
+    ``ip`` stops before the instruction at that address is fetched, ``upc`` before that
+    microinstruction runs, ``watch`` after a tick that wrote one of the addresses and a
+    condition after the tick on which ``condition(registers)`` becomes true. Resuming steps
+    over the breakpoint the machine is sitting on. While nothing is armed ``run_until``
+    runs its plain loop.
+    """
+
+    def __init__(self):
+        self.ip: set[int] = set()
+        self.upc: set[int] = set()
+        self.watch: set[int] = set()
+        self.conditions: list[Callable[..., object]] = []
+        self.held: list[bool] = []
+
+    def clear(self):
+        self.ip.clear()
+        self.upc.clear()
+        self.watch.clear()
+        self.conditions.clear()
+
+    def __bool__(self):
+        return bool(self.ip or self.upc or self.watch or self.conditions)
+
+    def before_tick(self, cpu):
+        r = cpu.registers
+        if cpu.fetch_pending:
+            return ("ip", r.IP) if r.IP in self.ip else None
+        return ("upc", r.uPC) if r.uPC in self.upc else None
+
+    def arm_conditions(self, registers):
+        self.held = [bool(condition(registers)) for condition in self.conditions]
+
+    def condition_hit(self, registers):
+        """First condition that became true on the last tick."""
+        was = self.held
+        self.held = [bool(condition(registers)) for condition in self.conditions]
+        for condition, before, now in zip(self.conditions, was, self.held, strict=True):
+            if now and not before:
+                return "condition", condition
+        return None
+
+
+class WatchedMemory:
+    """Data memory wrapper noting writes to the watched addresses in ``hits``."""
+
+    def __init__(self, backing, watch, hits):
+        self.backing = backing
+        self.watch = watch
+        self.hits = hits
+
+    def get(self, addr, default=0):
+        return self.backing.get(addr, default)
+
+    def __getitem__(self, addr):
+        return self.backing[addr]
+
+    def __setitem__(self, addr, value):
+        if addr in self.watch:
+            self.hits.append(addr)
+        self.backing[addr] = value
+
+    def __iter__(self):
+        return iter(self.backing)
+
+    def __len__(self):
+        return len(self.backing)
+
+    def keys(self):
+        return self.backing.keys()
+
+    def items(self):
+        return self.backing.items()
@@ -0,0 +1,81 @@
+import argparse
+import hashlib
+import os
+from pathlib import Path
+
+import expr_to_asm
+import linker
+
+# Objects are only reused while these are unchanged
+COMPILER_MODULES = ("constant_fold.py", "expr_to_asm.py", "instrucrions.py", "linker.py", "tokenizer.py")
+
+
+def compiler_fingerprint():
+    digest = hashlib.sha256()
+    for name in COMPILER_MODULES:
+        digest.update((Path(__file__).parent / name).read_bytes())
+    return digest.hexdigest()
+
+
+def object_key(source_path, fingerprint):
+    """Content hash of a unit: the compiler, the source path (kept in the source map) and the source text."""
+    digest = hashlib.sha256(fingerprint.encode())
+    digest.update(os.path.abspath(source_path).encode() + b"\0")
+    digest.update(Path(source_path).read_bytes())
+    return digest.hexdigest()
+
+
+def compile_cached(source_path, cache_dir, fingerprint):
+    """Return ``(object, reused)``; a fresh object is stored under its content hash."""
+    path = os.path.join(cache_dir, object_key(source_path, fingerprint) + ".obj")
+    try:
+        return linker.load_object(path), True
+    except FileNotFoundError:
+        pass
+    obj = expr_to_asm.compile_file(source_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    linker.save_object(tmp_path, obj)
+    Path(tmp_path).replace(path)
+    return obj, False
+
+
+def build(sources, output_path, cache_dir=None):
+    """Compile (or reuse) every unit, link them in order and write the binary; return the units compiled afresh.
+
+    ``.obj`` files among ``sources`` are linked as they are.
+    """
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        fingerprint = compiler_fingerprint()
+    objects, compiled = [], []
+    for source in sources:
+        if source.endswith(".obj"):
+            objects.append(linker.load_object(source))
+            continue
+        if cache_dir is None:
+            obj, reused = expr_to_asm.compile_file(source), False
+        else:
+            obj, reused = compile_cached(source, cache_dir, fingerprint)
+        objects.append(obj)
+        if not reused:
+            compiled.append(source)
+    code, data, source_map = linker.link(objects)
+    expr_to_asm.write_binary_file(output_path, code, data)
+    expr_to_asm.write_source_map(output_path + ".map", source_map)
+    return compiled
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile Lisp units separately and link them into one binary")
+    parser.add_argument("sources", nargs="+", help=".lisp units (or .obj files); the first one's top level runs first")
+    parser.add_argument("-o", "--output", default="out.bin", help="binary to write")
+    parser.add_argument("--cache-dir", help="reuse unchanged units from this content-hashed object cache")
+    parser.add_argument("-c", "--compile-only", action="store_true", help="only write <source>.obj for every unit")
+    args = parser.parse_args()
+
+    if args.compile_only:
+        for source in args.sources:
+            linker.save_object(str(Path(source).with_suffix(".obj")), expr_to_asm.compile_file(source))
+    else:
+        for source in build(args.sources, args.output, args.cache_dir):
+            print("compiled", source)
@@ -0,0 +1,158 @@
+import random
+
+POLICIES = ("lru", "fifo", "random")
+WRITE_POLICIES = ("back", "through")
+
+
+class InvalidCacheConfigError(ValueError):
+    """Cache geometry must be positive and the policies must be known."""
+
+
+class CacheLine:
+    __slots__ = ("dirty", "tag")
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.dirty = False
+
+
+class Cache:
+    """Timing model of a set-associative data cache.
+
+    Values stay in the backing memory; the cache only tracks tags and dirty bits
+    and reports the latency of each access (1 tick on a hit, 10 ticks for every
+    main-memory transfer by default).
+    """
+
+    def __init__(self, sets=16, ways=1, line_size=4, policy="lru", write_policy="back",
+                 hit_ticks=1, miss_ticks=10, seed=0):
+        if sets < 1 or ways < 1 or line_size < 1:
+            raise InvalidCacheConfigError()
+        if policy not in POLICIES or write_policy not in WRITE_POLICIES:
+            raise InvalidCacheConfigError()
+        self.sets = sets
+        self.ways = ways
+        self.line_size = line_size
+        self.policy = policy
+        self.write_back = write_policy == "back"
+        self.hit_ticks = hit_ticks
+        self.miss_ticks = miss_ticks
+        self.rng = random.Random(seed)
+        self.lines: list[list[CacheLine]] = [[] for _ in range(sets)]
+        self.stats = {"reads": 0, "writes": 0, "hits": 0, "misses": 0, "evictions": 0, "writebacks": 0,
+                      "stall_ticks": 0}
+
+    def _find(self, addr):
+        line_no = addr // self.line_size
+        ways = self.lines[line_no % self.sets]
+        tag = line_no // self.sets
+        for line in ways:
+            if line.tag == tag:
+                if self.policy == "lru":
+                    ways.remove(line)
+                    ways.append(line)
+                return ways, tag, line
+        return ways, tag, None
+
+    def _fill(self, ways, tag):
+        ticks = self.miss_ticks
+        if len(ways) >= self.ways:
+            victim = ways.pop(self.rng.randrange(len(ways)) if self.policy == "random" else 0)
+            self.stats["evictions"] += 1
+            if victim.dirty:
+                self.stats["writebacks"] += 1
+                ticks += self.miss_ticks
+        line = CacheLine(tag)
+        ways.append(line)
+        return line, ticks
+
+    def read(self, addr):
+        self.stats["reads"] += 1
+        ways, tag, line = self._find(addr)
+        if line is not None:
+            self.stats["hits"] += 1
+            return self.hit_ticks
+        self.stats["misses"] += 1
+        return self._fill(ways, tag)[1]
+
+    def write(self, addr):
+        self.stats["writes"] += 1
+        ways, tag, line = self._find(addr)
+        if line is not None:
+            self.stats["hits"] += 1
+            line.dirty = self.write_back
+            return self.hit_ticks if self.write_back else self.miss_ticks
+        self.stats["misses"] += 1
+        if not self.write_back:
+            return self.miss_ticks
+        line, ticks = self._fill(ways, tag)
+        line.dirty = True
+        return ticks
+
+    def get_state(self):
+        lines = [[[line.tag, line.dirty] for line in ways] for ways in self.lines]
+        version, internal, gauss = self.rng.getstate()
+        return {"lines": lines, "stats": dict(self.stats), "rng": [version, list(internal), gauss]}
+
+    def set_state(self, state):
+        self.lines = [[CacheLine(tag) for tag, _ in ways] for ways in state["lines"]]
+        for ways, saved in zip(self.lines, state["lines"]):
+            for line, (_, dirty) in zip(ways, saved):
+                line.dirty = dirty
+        self.stats = dict(state["stats"])
+        version, internal, gauss = state["rng"]
+        self.rng.setstate((version, tuple(internal), gauss))
+
+    def report(self):
+        s = self.stats
+        accesses = s["hits"] + s["misses"]
+        hit_rate = s["hits"] / accesses if accesses else 0.0
+        write_policy = "write-back" if self.write_back else "write-through"
+        lines = [
+            f"=== cache: {self.sets} sets x {self.ways} ways x {self.line_size} words, {self.policy}, {write_policy} ===",
+            *(f"{key:>11} : {value}" for key, value in s.items()),
+            f"{'hit rate':>11} : {hit_rate:.4f}",
+        ]
+        return "\n".join(lines)
+
+
+class CachedMemory:
+    """Data memory seen by the control unit through a cache.
+
+    ``get`` and item assignment are the control unit's ports: they go through
+    the cache and add the stall beyond the one tick already counted for the
+    microinstruction to ``macro_cnt``. Item reads and iteration are untimed.
+    """
+
+    def __init__(self, backing, cache, registers):
+        self.backing = backing
+        self.cache = cache
+        self.registers = registers
+
+    def _stall(self, ticks):
+        if ticks > 1:
+            self.registers.macro_cnt += ticks - 1
+            self.cache.stats["stall_ticks"] += ticks - 1
+
+    def get(self, addr, default=0):
+        self._stall(self.cache.read(addr))
+        return self.backing.get(addr, default)
+
+    def __getitem__(self, addr):
+        return self.backing[addr]
+
+    def __setitem__(self, addr, value):
+        self._stall(self.cache.write(addr))
+        self.backing[addr] = value
+
+    def __iter__(self):
+        return iter(self.backing)
+
+    def __len__(self):
+        return len(self.backing)
+
+    def keys(self):
+        return self.backing.keys()
+
+    def items(self):
+        return self.backing.items()
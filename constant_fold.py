@@ -0,0 +1,190 @@
+from cpu_sim import ALU_OPS
+
+MASK = 0xFFFFFFFF
+ARITHMETIC = {"+": 0, "-": 1, "*": 2, "/": 3}
+COMPARISONS = ("<", ">", "=")
+SUB = 1
+DIV = 3
+# A taken jump latches ACC = IP, which leaves Z == 0 and N == 0 like this value does
+AFTER_TAKEN_JUMP = 1
+
+# Is the branch emitted by resolve_jump_op taken for a comparison whose difference is d?
+# jz: Z == 1, jlt: N == 1 and Z == 1 (never), jgt: N == 0 and Z == 1
+BRANCH_TAKEN = {
+    "=": lambda d: d == 0,
+    ">": lambda d: False,
+    "<": lambda d: d == 0,
+}
+
+
+def alu(op, left, right):
+    """Value the machine computes for ``left op right`` with both operands as 32-bit words."""
+    return ALU_OPS[op](left & MASK, right & MASK)
+
+
+def foldable(op, left, right):
+    # a literal divisor reaches the ALU signed and a computed one unsigned, so only
+    # non-negative division is folded: there every reading of the operands agrees
+    if left["type"] != "number" or right["type"] != "number":
+        return False
+    return op != DIV or (left["value"] >= 0 and right["value"] >= 0)
+
+
+def number(value):
+    return {"type": "number", "value": value}
+
+
+def fold_expr(expr, env):
+    """Fold constants in an expression; ``env`` maps variable names to known values and is cleared by calls."""
+    if expr is None:
+        return None
+    kind = expr["type"]
+    if kind == "var" and expr["name"] in env:
+        return number(env[expr["name"]])
+    if kind == "funcall":
+        folded = {**expr, "args": [fold_expr(arg, env) for arg in expr["args"]]}
+        env.clear()
+        return folded
+    if kind != "binop":
+        return expr
+    left = fold_expr(expr["left"], env)
+    right = fold_expr(expr["right"], env)
+    op = ARITHMETIC.get(expr["op"])
+    if op is not None and foldable(op, left, right):
+        return number(alu(op, left["value"], right["value"]))
+    return {**expr, "left": left, "right": right}
+
+
+def condition_value(cond):
+    """Difference the comparison leaves in ACC, or None when it is not known at compile time."""
+    if cond["type"] != "binop" or cond["op"] not in COMPARISONS:
+        return None
+    left, right = cond["left"], cond["right"]
+    if left["type"] == right["type"] == "number":
+        return alu(SUB, left["value"], right["value"])
+    return None
+
+
+def assigned_names(stmts):
+    """Variables a list of statements may write, or None when it calls a function (anything may change)."""
+    names = set()
+    for stmt in stmts:
+        if stmt is None:
+            continue
+        kind = stmt["type"]
+        if kind == "set_get" or _calls(stmt):
+            return None
+        if kind in ("var", "set"):
+            names.add(stmt["name"])
+        elif kind == "read_line":
+            names.add(stmt["value"]["name"])
+        nested = [stmt.get("then"), stmt.get("else"), *stmt.get("body", [])]
+        inner = assigned_names(nested)
+        if inner is None:
+            return None
+        names |= inner
+    return names
+
+
+def _calls(node):
+    if isinstance(node, dict):
+        return node.get("type") == "funcall" or any(_calls(value) for value in node.values())
+    if isinstance(node, list):
+        return any(_calls(item) for item in node)
+    return False
+
+
+def kill(env, names):
+    if names is None:
+        env.clear()
+        return
+    for name in names:
+        env.pop(name, None)
+
+
+def fold_assignment(stmt, env):
+    if stmt.get("expr") is None:
+        env.pop(stmt["name"], None)
+        return stmt
+    expr = fold_expr(stmt["expr"], env)
+    if expr["type"] == "number":
+        env[stmt["name"]] = expr["value"]
+    else:
+        env.pop(stmt["name"], None)
+    return {**stmt, "expr": expr}
+
+
+def fold_if(stmt, env):
+    cond = fold_expr(stmt["cond"], env)
+    d = condition_value(cond)
+    then, otherwise = stmt["then"], stmt.get("else")
+    # cond; jX else; then; jX end; else: else; end: -- without then: cond; jX end; else: else; end:
+    # A taken first jump lands on the first instruction of else, past the second jump, whatever
+    # the opcode. Flags after the if are kept too: an enclosing if may test them.
+    if d is not None and BRANCH_TAKEN[cond["op"]](d):
+        runs_else = then is not None and otherwise
+        return fold_seq(stmt, [number(AFTER_TAKEN_JUMP), *([otherwise] if runs_else else [])], env)
+    if d is not None and then is None:
+        return fold_seq(stmt, [number(d), *([otherwise] if otherwise else [])], env)
+    kill(env, assigned_names([then, otherwise]))
+    then = fold_stmt(then, dict(env)) if then is not None else None
+    otherwise = fold_stmt(otherwise, dict(env)) if otherwise else otherwise
+    return {**stmt, "cond": cond, "then": then, "else": otherwise}
+
+
+def fold_seq(stmt, body, env):
+    seq = {"type": "seq", "body": [fold_stmt(s, env) if s["type"] != "number" else s for s in body]}
+    if "span" in stmt:
+        seq["span"] = stmt["span"]
+    return seq
+
+
+def fold_while(stmt, env):
+    kill(env, assigned_names(stmt["body"]))
+    cond = fold_expr(stmt["cond"], env)
+    d = condition_value(cond)
+    if d is not None and BRANCH_TAKEN[cond["op"]](d):
+        return fold_seq(stmt, [number(AFTER_TAKEN_JUMP)], env)
+    return {**stmt, "cond": cond, "body": fold_block(stmt["body"], dict(env))}
+
+
+def fold_defunc(stmt, env):
+    return {**stmt, "body": fold_block(stmt["body"], {})}
+
+
+STMT_FOLDERS = {
+    "var": fold_assignment,
+    "set": fold_assignment,
+    "if": fold_if,
+    "while": fold_while,
+    "defunc": fold_defunc,
+}
+
+
+def fold_stmt(stmt, env):
+    folder = STMT_FOLDERS.get(stmt["type"])
+    if folder is not None:
+        return folder(stmt, env)
+    if stmt["type"] in ("binop", "funcall"):
+        return fold_expr(stmt, env)
+    if stmt["type"] == "read_line":
+        env.pop(stmt["value"]["name"], None)
+    elif stmt["type"] == "set_get":
+        env.clear()
+    return stmt
+
+
+def fold_block(stmts, env):
+    return [fold_stmt(stmt, env) for stmt in stmts]
+
+
+def fold_program(ast_list):
+    """Fold constant arithmetic, propagate constant variables and resolve constant if/while conditions.
+
+    Arithmetic follows the machine: operands are 32-bit words, results wrap to signed 32 bits, ``/`` divides
+    the unsigned words and gives 0 for a zero divisor. Comparisons stay binop nodes because the jump opcode
+    depends on the operator. A condition that is known statically becomes a ``seq`` of the branch that
+    actually runs, led by a number that leaves the flags as the jump would.
+    """
+    env: dict[str, int] = {}
+    return fold_block(ast_list, env)
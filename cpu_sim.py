@@ -1,6 +1,18 @@
-import struct
+import math
 
+from binary_image import read_image
+from breakpoints import Breakpoints, WatchedMemory
+from cache import Cache, CachedMemory
+from data_memory import DataMemory
 from microcode_memory import OPCODE_TO_UADDR, ROM
+from ports import InputPort, OutputPort
+from profiler import PROFILE_FORMATS, Profile, ProfiledMemory, load_source_map
+from snapshot import Snapshot
+from tracer import TRACE_LEVELS, UnknownTraceError, open_tracer
+
+
+class UnknownModeError(ValueError):
+    """Simulation mode must be one of the engines known to engine_class."""
 
 
 class Registers:
@@ -21,56 +33,116 @@ class Registers:
 
 class Memory:
     def __init__(self):
-        self.data = {}
+        self.data: DataMemory | CachedMemory | ProfiledMemory | WatchedMemory = DataMemory()
         self.instr = []
 
 
-def _decode_microcode(uword):
-    return {
-        "halted": (uword >> 26) & 1,
-        "acc_l": (uword >> 25) & 1,
-        "dal": (uword >> 24) & 1,
-        "mem_l": (uword >> 23) & 1,
-        "sp_l": (uword >> 22) & 1,
-        "dr_l": (uword >> 21) & 1,
-        "out_l": (uword >> 20) & 1,
-        "ip_l": (uword >> 19) & 1,
-        "adr_sel": (uword >> 18) & 1,
-        "io_sel": (uword >> 17) & 1,
-        "cla": (uword >> 15) & 0b11,
-        "cld": (uword >> 13) & 0b11,
-        "ip_sel": (uword >> 12) & 1,
-        "alu_op": (uword >> 9) & 0b111,
-        "cond": (uword >> 6) & 0b111,
-        "next_u": uword & 0x3F,
-    }
-
-
 def to_signed32(x):
     x &= 0xFFFFFFFF
     return x if x < 0x80000000 else x - 0x100000000
 
 
+def _alu_div(l_alu, r_alu):
+    return to_signed32(l_alu // r_alu) if r_alu != 0 else 0
+
+
+ALU_OPS = (
+    lambda l_alu, r_alu: to_signed32(l_alu + r_alu),
+    lambda l_alu, r_alu: to_signed32(l_alu - r_alu),
+    lambda l_alu, r_alu: to_signed32(l_alu * r_alu),
+    _alu_div,
+    lambda l_alu, r_alu: to_signed32(l_alu + r_alu + 1),
+    lambda l_alu, r_alu: to_signed32(l_alu + r_alu - 1),
+    lambda l_alu, r_alu: 0,
+    lambda l_alu, r_alu: 0,
+)
+
+
+class MicroInstruction:
+    __slots__ = (
+        "acc_l",
+        "adr_sel",
+        "alu",
+        "alu_op",
+        "cla",
+        "cld",
+        "cond",
+        "dal",
+        "dr_l",
+        "halted",
+        "io_sel",
+        "ip_l",
+        "ip_sel",
+        "mem_l",
+        "next_u",
+        "out_l",
+        "sp_l",
+    )
+
+    def __init__(self, uword):
+        self.halted = (uword >> 27) & 1
+        self.acc_l = (uword >> 26) & 1
+        self.dal = (uword >> 25) & 1
+        self.mem_l = (uword >> 24) & 1
+        self.sp_l = (uword >> 23) & 1
+        self.dr_l = (uword >> 22) & 1
+        self.out_l = (uword >> 21) & 1
+        self.ip_l = (uword >> 20) & 1
+        self.adr_sel = (uword >> 19) & 1
+        self.io_sel = (uword >> 18) & 1
+        self.cla = (uword >> 16) & 0b11
+        self.cld = (uword >> 14) & 0b11
+        self.ip_sel = (uword >> 13) & 1
+        self.alu_op = (uword >> 10) & 0b111
+        self.cond = (uword >> 7) & 0b111
+        self.next_u = uword & 0x7F
+        self.alu = ALU_OPS[self.alu_op]
+
+
+def decode_rom(rom):
+    return [MicroInstruction(uword) for uword in rom]
+
+
 class CPU:
-    def __init__(self, instr_mem, data_mem, log_path="trace.log", input_path=None, output_path=None):
+    DEFAULT_TRACE_LEVEL = "full"
+    TRACE_LEVELS: tuple[str, ...] = TRACE_LEVELS
+
+    def __init__(self, instr_mem, data_mem, log_path="trace.log", input_path=None, output_path=None, cache=None,
+                 trace_level=None, trace_format="text", profile=None):
         self.ROM = ROM
         self.LUT = OPCODE_TO_UADDR
+        self.microcode = decode_rom(self.ROM)
 
         self.registers = Registers()
         self.memory = Memory()
         self.memory.instr = instr_mem
-        self.memory.data = data_mem
-
-        self.input_buffer = list(open(input_path, encoding="utf-8").read()) if input_path else []
-        self.output_buffer = []
-        self.output_path = output_path
+        data = data_mem if isinstance(data_mem, DataMemory) else DataMemory(data_mem)
+        self.data_memory = data
+        self.memory.data = data
+        self.cache = cache
+        if cache is not None:
+            self.memory.data = CachedMemory(data, cache, self.registers)
 
+        self.in_port = InputPort(input_path)
+        self.out_port = OutputPort(output_path)
 
         self.last_uPC = 0
-        self.log = open(log_path, "w", encoding="utf-8")
+        self.fetch_pending = True
+        self.breakpoints = Breakpoints()
+        self.stop_reason: tuple[str, object] | None = None
+        trace_level = trace_level or self.DEFAULT_TRACE_LEVEL
+        if trace_level not in self.TRACE_LEVELS:
+            raise UnknownTraceError(trace_level)
+        self.tracer, self.trace_fetch, self.trace_state = open_tracer(log_path, trace_level, trace_format)
+
+        self.profile = profile
+        if profile is not None:
+            self.memory.data = ProfiledMemory(self.memory.data, profile)
+            self.trace_fetch, self.trace_state = profile.hooks(self.trace_fetch, self.trace_state)
 
     def fetch_next_instruction(self):
         r = self.registers
+        self.fetch_pending = False
         if r.IP >= len(self.memory.instr):
             r.halted = True
             return
@@ -82,47 +154,33 @@ class CPU:
         opcode = (r.IR >> 27) & 0x1F
         r.uPC = self.LUT[opcode]
         r.macro_cnt += 1
-        self.log.write(f"[TICK  {r.macro_cnt} (FETCH)] IP={r.IP:04} OPCODE={opcode:02}\n")
-        self.log.write("-" * 40 + "\n")
-        self.step()
+        if self.trace_fetch is not None:
+            self.trace_fetch(r.macro_cnt, r.IP, r.IR)
 
     def step(self):
-        r = self.registers
-        uword = self.ROM[r.uPC]
-
-        signals = _decode_microcode(uword)
-        alu = self._execute_alu(signals)
-        self._apply_latches(signals, alu)
-        self._update_flags_and_branch(signals, alu)
+        s = self.microcode[self.registers.uPC]
+        alu = self._execute_alu(s)
+        self._apply_latches(s, alu)
+        self._update_flags_and_branch(s, alu)
 
     def _execute_alu(self, s):
         r = self.registers
-        left = {1: r.ACC, 2: r.SP}.get(s["cla"], 0)
-        right = {1: r.DR, 2: r.IP}.get(s["cld"], 0)
-        op = s["alu_op"]
-
-
-
-        alu_ops = {
-            0: lambda l_alu, r_alu: to_signed32(l_alu + r_alu),
-            1: lambda l_alu, r_alu: to_signed32(l_alu - r_alu),
-            2: lambda l_alu, r_alu: to_signed32(l_alu * r_alu),
-            3: lambda l_alu, r_alu: to_signed32(l_alu // r_alu) if r_alu != 0 else 0,
-            4: lambda l_alu, r_alu: to_signed32(l_alu + r_alu + 1),
-            5: lambda l_alu, r_alu: to_signed32(l_alu + r_alu - 1),
-        }
-
-        return alu_ops.get(op, lambda l_alu, r_alu: 0)(left, right) & 0xFFFFFFFF
+        cla = s.cla
+        cld = s.cld
+        left = r.ACC if cla == 1 else r.SP if cla == 2 else 0
+        right = r.DR if cld == 1 else r.IP if cld == 2 else r.ARG if cld == 3 else 0
+        return s.alu(left, right) & 0xFFFFFFFF
 
     def _update_acc(self, s, alu):
         r = self.registers
-        if not s["acc_l"]:
+        if not s.acc_l:
             return
-        if s["io_sel"]:
-            if self.input_buffer:
-                r.ACC = ord(self.input_buffer.pop(0))
-            else:
+        if s.io_sel:
+            ch = self.in_port.read()
+            if ch is None:
                 r.halted = True
+            else:
+                r.ACC = ch
         else:
             r.ACC = alu
         r.Z = int(r.ACC == 0)
@@ -130,22 +188,21 @@ class CPU:
 
     def _update_memory_access(self, s, alu):
         r = self.registers
-        if s["dal"]:
-            r.DataA = r.ARG if s["adr_sel"] else alu
-        if s["mem_l"]:
+        if s.dal:
+            r.DataA = r.ARG if s.adr_sel else alu
+        if s.mem_l:
             self.memory.data[r.DataA] = r.ACC & 0xFFFFFFFF
-        if s["dr_l"]:
+        if s.dr_l:
             r.DR = self.memory.data.get(r.DataA, 0)
 
     def _update_sp_ip_out(self, s, alu):
         r = self.registers
-        if s["sp_l"]:
+        if s.sp_l:
             r.SP = alu
-        if s["out_l"]:
-                self.output_buffer.append(r.ACC)
-                print(f"[OUT]: {r.ACC}")
-        if s["ip_l"]:
-            r.IP = alu if s["ip_sel"] == 0 else r.ARG
+        if s.out_l:
+            self.out_port.write(r.ACC)
+        if s.ip_l:
+            r.IP = alu if s.ip_sel == 0 else r.ARG
 
     def _apply_latches(self, s, alu):
         self._update_acc(s, alu)
@@ -154,7 +211,7 @@ class CPU:
 
     def _update_flags_and_branch(self, s, alu):
         r = self.registers
-        cond = s["cond"]
+        cond = s.cond
         cond_true = (
                 cond == 0b001 or
                 (cond == 0b010 and r.Z == 1) or
@@ -164,24 +221,101 @@ class CPU:
         )
 
         r.macro_cnt += 1
-        self.print_state()
+        if self.trace_state is not None:
+            self.trace_state(r)
 
         self.last_uPC = r.uPC
-        r.uPC = s["next_u"] if cond_true else (r.uPC + 1) & 0x3F
+        r.uPC = s.next_u if cond_true else (r.uPC + 1) & 0x7F
 
-        if s["halted"]:
+        if s.halted:
             r.halted = True
 
         if r.uPC == 0 and not r.halted and self.last_uPC != 0:
-            self.fetch_next_instruction()
+            self.fetch_pending = True
 
-    def run(self):
-        self.fetch_next_instruction()
-        while not self.registers.halted:
+    def run(self, limit=math.inf):
+        """Run to HALT, or until ``macro_cnt`` reaches ``limit``; only a halted machine is finished."""
+        r = self.registers
+        while not r.halted and r.macro_cnt < limit:
+            self.advance()
+        if r.halted:
+            self.finish()
+
+    def advance(self):
+        """One tick: fetch the next instruction or run one microinstruction."""
+        if self.fetch_pending:
+            self.fetch_next_instruction()
+        else:
             self.step()
-        if self.output_path:
-            with open(self.output_path, "w", encoding="utf-8") as f:
-                f.write(str(self.output_buffer))
+
+    def run_until(self, tick=None):
+        """Run until ``macro_cnt`` reaches ``tick``, the machine halts or an armed breakpoint is hit.
+
+        A machine that halts is finished as by ``run``: the output file and the trace are closed.
+
+        Return ``halted``; why the run stopped is left in ``stop_reason``: ``("halted", None)``,
+        ``("tick", macro_cnt)`` or the breakpoint, see ``Breakpoints``.
+        """
+        r = self.registers
+        limit = math.inf if tick is None else tick
+        step_over, self.stop_reason = self.stop_reason, None
+        if self.breakpoints:
+            self._run_checked(limit, step_over)
+        else:
+            while not r.halted and r.macro_cnt < limit:
+                self.advance()
+        if self.stop_reason is None:
+            self.stop_reason = ("halted", None) if r.halted else ("tick", r.macro_cnt)
+        if r.halted:
+            self.finish()
+        return r.halted
+
+    def _run_checked(self, limit, step_over):
+        """The ``run_until`` loop with breakpoints; ``step_over`` is the stop the machine may still be sitting on."""
+        r = self.registers
+        breakpoints = self.breakpoints
+        breakpoints.arm_conditions(r)
+        data = self.memory.data
+        hits: list[int] = []
+        if breakpoints.watch:
+            self.memory.data = WatchedMemory(data, breakpoints.watch, hits)
+        try:
+            stop = None
+            while stop is None and not r.halted and r.macro_cnt < limit:
+                stop = breakpoints.before_tick(self)
+                if stop == step_over:
+                    stop = None
+                step_over = None
+                if stop is None:
+                    self.advance()
+                    stop = self._after_tick(hits)
+            self.stop_reason = stop
+        finally:
+            self.memory.data = data
+
+    def _after_tick(self, hits):
+        if hits:
+            addr = hits[-1]
+            hits.clear()
+            return "watch", addr
+        return self.breakpoints.condition_hit(self.registers)
+
+    def snapshot(self):
+        return Snapshot.capture(self)
+
+    def restore(self, snap):
+        snap.apply(self)
+
+    @property
+    def output_buffer(self):
+        """Words written by OUT; with an output file they are read back from it rather than kept in memory."""
+        return self.out_port.words()
+
+    def finish(self):
+        if self.tracer is not None:
+            self.tracer.close()
+        self.in_port.close()
+        self.out_port.close()
 
     def print_memory(self):
         print("=== .data memory (адрес: значение) ===")
@@ -197,46 +331,78 @@ class CPU:
             print(f"{i:04}: opcode={opcode:>2}, arg={arg}")
 
     def print_state(self):
-        r = self.registers
-        self.log.write(f"[TICK {r.macro_cnt}] uPC={r.uPC:02} IR={r.IR:08X}\n")
-        self.log.write(f"ACC={r.ACC:11} DR={r.DR:11} IP={r.IP:08X} SP={r.SP:08X}\n")
-        self.log.write(f"DataA={r.DataA} Z={r.Z} N={r.N}\n")
-        self.log.write("-" * 40 + "\n")
+        if self.tracer is not None:
+            self.tracer.state(self.registers)
 
 
 def load_binary(path):
-    with open(path, "rb") as f:
-        data = f.read()
+    return read_image(path)
 
-    instr_count = struct.unpack_from(">I", data, 0)[0]
-    instr_mem = []
-    offset = 4
-    for _ in range(instr_count):
-        instr = struct.unpack_from(">I", data, offset)[0]
-        instr_mem.append(instr)
-        offset += 4
 
-    data_mem = {}
-    while offset < len(data):
-        addr, val = struct.unpack_from(">Ii", data, offset)
-        data_mem[addr] = val
-        offset += 8
+def engine_class(mode):
+    if mode == "mc":
+        return CPU
+    if mode == "fast":
+        from fast_sim import FastCPU
 
-    return instr_mem, data_mem
+        return FastCPU
+    if mode == "block":
+        from block_sim import BlockCPU
 
+        return BlockCPU
+    raise UnknownModeError(mode)
 
-def main(bin_path, input_path=None, output_path=None, log_path="trace.log"):
+
+def main(bin_path, input_path=None, output_path=None, log_path="trace.log", mode="mc", cache=None,
+         trace_level=None, trace_format="text", profile=None):
     instr_mem, data_mem = load_binary(bin_path)
-    cpu = CPU(instr_mem, data_mem, input_path=input_path, output_path=output_path, log_path=log_path)
+    cpu = engine_class(mode)(instr_mem, data_mem, input_path=input_path, output_path=output_path,
+                             log_path=log_path, cache=cache, trace_level=trace_level, trace_format=trace_format,
+                             profile=profile)
     cpu.run()
+    if cache is not None:
+        print(cache.report())
+    return cpu
 
 
 if __name__ == "__main__":
-    import sys
-
-    if len(sys.argv) != 4:
-        print("Usage:")
-        print("  python cpu_sim.py <program.bin> <input.txt> <output.txt>")
-        sys.exit(1)
-
-    main(sys.argv[1], sys.argv[2], sys.argv[3])
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Microcoded accumulator CPU simulator")
+    parser.add_argument("program", help="program.bin")
+    parser.add_argument("input", help="input.txt")
+    parser.add_argument("output", help="output.txt")
+    parser.add_argument("--mode", choices=["mc", "fast", "block"], default="mc",
+                        help="mc: microinstruction-level with trace, fast: instruction-level, "
+                             "block: translated basic blocks")
+    parser.add_argument("--trace", default="trace.log", help="trace file")
+    parser.add_argument("--trace-level", choices=TRACE_LEVELS,
+                        help="off, macro (FETCH records only) or full; default: full for mc, off otherwise")
+    parser.add_argument("--trace-format", choices=["text", "binary"], default="text",
+                        help="binary records are rendered to text with trace_decode.py")
+    parser.add_argument("--cache", action="store_true", help="access data memory through the cache model")
+    parser.add_argument("--cache-sets", type=int, default=16)
+    parser.add_argument("--cache-ways", type=int, default=1, help="1 = direct-mapped")
+    parser.add_argument("--cache-line", type=int, default=4, help="line size in words")
+    parser.add_argument("--cache-policy", choices=["lru", "fifo", "random"], default="lru")
+    parser.add_argument("--cache-write", choices=["back", "through"], default="back")
+    parser.add_argument("--profile", help="write execution counters (opcode, uPC, IP, data addresses) to this file")
+    parser.add_argument("--profile-format", choices=PROFILE_FORMATS, default="json")
+    parser.add_argument("--source-map", help="compiler source map for per-line ticks (default: <program>.map)")
+    args = parser.parse_args()
+
+    data_cache = None
+    if args.cache:
+        data_cache = Cache(sets=args.cache_sets, ways=args.cache_ways, line_size=args.cache_line,
+                           policy=args.cache_policy, write_policy=args.cache_write)
+    counters = Profile() if args.profile else None
+    if counters is not None:
+        try:
+            counters.source_map = load_source_map(args.source_map or args.program + ".map")
+        except FileNotFoundError:
+            if args.source_map:
+                raise
+    main(args.program, args.input, args.output, log_path=args.trace, mode=args.mode, cache=data_cache,
+         trace_level=args.trace_level, trace_format=args.trace_format, profile=counters)
+    if counters is not None:
+        counters.save(args.profile, args.profile_format)
@@ -0,0 +1,137 @@
+from array import array
+from operator import itemgetter
+
+STACK_TOP = 0x7FFFFFFC
+STATIC_LIMIT = 1 << 20
+STACK_LIMIT = 1 << 20
+
+
+class UnmappedAddressError(IndexError):
+    """Write to a data address outside both the static and the stack segment."""
+
+
+class DataImage:
+    """Initial data of a binary as ``(base, words)`` runs of consecutive addresses, ``words`` being an ``array("q")``."""
+
+    def __init__(self, runs):
+        self.runs = runs
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        runs: list[tuple[int, array[int]]] = []
+        for addr, val in sorted(pairs, key=itemgetter(0)):
+            if runs and runs[-1][0] + len(runs[-1][1]) == addr:
+                runs[-1][1].append(val)
+            else:
+                runs.append((addr, array("q", [val])))
+        return cls(runs)
+
+    def items(self):
+        for base, words in self.runs:
+            yield from enumerate(words, base)
+
+
+class DataMemory:
+    """Segmented data memory.
+
+    The static segment covers addresses ``[0, static_limit)`` and is stored in a
+    contiguous array indexed by address. The stack segment covers
+    ``(STACK_TOP - stack_limit, STACK_TOP]`` and is stored in a second array
+    indexed by ``STACK_TOP - addr``, so it grows by appending as SP goes down.
+    Both grow on write and never shrink. Reads of addresses that were never
+    written, inside or outside the segments, return 0; writes outside the
+    segments raise ``UnmappedAddressError``.
+
+    ``image`` keeps the static segment as loaded, so the state can be saved as a
+    delta against it.
+
+    Cells are 64-bit so that the raw values the control unit latches (signed
+    words from the image, unsigned words from ACC) are kept exactly.
+    """
+
+    def __init__(self, image=None, static_limit=STATIC_LIMIT, stack_limit=STACK_LIMIT):
+        self.static_limit = static_limit
+        self.stack_limit = stack_limit
+        self.static = array("q")
+        self.stack = array("q")
+        if isinstance(image, DataImage):
+            for base, words in image.runs:
+                self.load_run(base, words)
+        else:
+            for addr, val in (image or {}).items():
+                self[addr] = val
+        self.image = array("q", self.static)
+
+    def get(self, addr, default=0):
+        if 0 <= addr < len(self.static):
+            return self.static[addr]
+        idx = STACK_TOP - addr
+        if 0 <= idx < len(self.stack):
+            return self.stack[idx]
+        return default
+
+    def __getitem__(self, addr):
+        return self.get(addr)
+
+    def __setitem__(self, addr, value):
+        static = self.static
+        if 0 <= addr < len(static):
+            static[addr] = value
+        elif 0 <= addr < self.static_limit:
+            static.extend(array("q", bytes(8 * (addr - len(static)))))
+            static.append(value)
+        else:
+            self._write_stack(addr, value)
+
+    def load_run(self, base, words):
+        """Write ``words`` from ``base`` on with one slice assignment when they fit the static segment."""
+        end = base + len(words)
+        if not 0 <= base < end <= self.static_limit:
+            for addr, val in enumerate(words, base):
+                self[addr] = val
+            return
+        static = self.static
+        if end > len(static):
+            static.extend(array("q", bytes(8 * (end - len(static)))))
+        static[base:end] = words
+
+    def _write_stack(self, addr, value):
+        idx = STACK_TOP - addr
+        stack = self.stack
+        if 0 <= idx < len(stack):
+            stack[idx] = value
+        elif 0 <= idx < self.stack_limit:
+            stack.extend(array("q", bytes(8 * (idx - len(stack)))))
+            stack.append(value)
+        else:
+            raise UnmappedAddressError(addr)
+
+    def __len__(self):
+        return len(self.static) + len(self.stack)
+
+    def keys(self):
+        yield from range(len(self.static))
+        yield from range(STACK_TOP, STACK_TOP - len(self.stack), -1)
+
+    def __iter__(self):
+        return self.keys()
+
+    def items(self):
+        for addr in self.keys():
+            yield addr, self.get(addr)
+
+    def delta(self):
+        image = self.image
+        addrs = array("q", (addr for addr, val in enumerate(self.static)
+                            if addr >= len(image) or image[addr] != val))
+        values = array("q", (self.static[addr] for addr in addrs))
+        return len(self.static), addrs, values, array("q", self.stack)
+
+    def load_delta(self, static_len, addrs, values, stack):
+        static = self.static
+        static[:] = self.image[:static_len]
+        if static_len > len(static):
+            static.extend(array("q", bytes(8 * (static_len - len(static)))))
+        for addr, val in zip(addrs, values):
+            static[addr] = val
+        self.stack[:] = stack
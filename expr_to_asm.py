@@ -1,23 +1,58 @@
-import struct
+import heapq
+import json
 import sys
 
-from instrucrions import OPCODE_TABLE
+from binary_image import write_image
+from constant_fold import fold_program
+from instrucrions import IMMEDIATE_OPS, OPCODE_TABLE, fits_immediate
+from linker import OBJECT_VERSION, link
 from tokenizer import LispParser, ast_to_expr
 
 
+class NestingTooDeepError(ValueError):
+    """Forms nest deeper than the recursive passes after the parser (AST, folding, code generation) can follow."""
+
+
 class CompileContext:
     def __init__(self):
         self.var_map = {}
         self.literal_pool = {}
         self.temp_counter = 0
+        self.free_temps = []
         self.next_addr = 0
         self.code = []
+        self.labels = []
+        self.relocations = []
         self.literal_rev = {}
-        self.var_is_number = {}
         self.array_sizes = {}
         self.functions = {}
         self.function_addrs = {}
-        self.pending_calls = []
+        self.function_params = {}
+        self.main_start = 0
+        self.tail_calls = set()
+        self.current_function = None
+        self.function_ranges = {}
+        self.source_map = []
+        # data words holding an address, moved along with the data by the linker
+        self.address_words = set()
+
+    def emit(self, op, *args):
+        """Append an instruction; a symbolic operand (label or ``PENDING`` call) goes to the relocation table."""
+        if args and isinstance(args[0], tuple):
+            self.relocations.append(len(self.code))
+        self.code.append((op, *args))
+
+    def new_label(self):
+        self.labels.append(None)
+        return ("LABEL", len(self.labels) - 1)
+
+    def place(self, label):
+        self.labels[label[1]] = len(self.code)
+
+    def truncate(self, size):
+        del self.code[size:]
+        while self.relocations and self.relocations[-1] >= size:
+            self.relocations.pop()
 
     def allocate_literal(self, value):
         if value in self.literal_rev:
@@ -40,167 +75,202 @@ class CompileContext:
     def lookup_var(self, name):
         return self.var_map[name]
 
-    def allocate_temp(self):
+    def allocate_static(self):
         addr = self.next_addr
         self.next_addr += 1
         return addr
 
+    def allocate_temp(self):
+        """Scratch slot, lowest free address first; hand it back with free_temp once its value is dead."""
+        if self.free_temps:
+            return heapq.heappop(self.free_temps)
+        return self.allocate_static()
+
+    def free_temp(self, *addrs):
+        for addr in addrs:
+            heapq.heappush(self.free_temps, addr)
+
     def store_string(self, s):
-        addr = self.allocate_temp()
+        addr = self.allocate_static()
         self.literal_pool[addr] = addr + 1
-        length = self.allocate_temp()
+        self.address_words.add(addr)
+        length = self.allocate_static()
         self.literal_pool[length] = len(s)
         for i, c in enumerate(s):
-            self.literal_pool[self.allocate_temp()] = ord(c)
+            self.literal_pool[self.allocate_static()] = ord(c)
         return addr
 
-    def define_function(self, name, params, body):
-        self.functions[name] = {"params": params, "body": body}
+    def define_function(self, name, params, body, span=None):
+        self.functions[name] = {"params": params, "body": body, "span": span}
 
-def compile_binop_expr(expr, ctx):
-    if expr["op"] in ("<", ">", "!=", "="):
-        code = compile_expr(expr["left"], ctx)
-        code += [("push",)]
-        code += compile_expr(expr["right"], ctx)
-        tmp = ctx.allocate_temp()
-        code += [("store", tmp), ("pop",)]
-        code += [("sub", tmp)]
-        return code
-
-    op_map = {"+": "add", "-": "sub", "*": "mul", "/": "div"}
-    code = compile_expr(expr["left"], ctx)
-    code += [("push",)]
-    code += compile_expr(expr["right"], ctx)
-    tmp = ctx.allocate_temp()
-    code += [("store", tmp), ("pop",)]
-    code += [(op_map[expr["op"]], tmp)]
-    return code
+BINOP_INSTRUCTIONS = {"+": "add", "-": "sub", "*": "mul", "/": "div", "<": "sub", ">": "sub", "!=": "sub", "=": "sub"}
 
 
-def compile_funcall_expr(expr, ctx):
-    fname = expr["name"]
-    args = expr["args"]
-    param_names = ctx.functions[fname]["params"]
+def immediate_operand(op, operand):
+    """Whether ``op`` can take ``operand`` from the instruction word.
 
-    code = []
-    for arg_expr, param in zip(args, param_names):
-        code += compile_expr(arg_expr, ctx)
-        param_name = param["name"] if isinstance(param, dict) else param
-        code += [("store", ctx.lookup_var(param_name))]
+    A negative divisor can't: ARG is sign-extended, while the pooled constant reaches div through
+    tmp as an unsigned word. add/sub/mul agree on the two.
+    """
+    if operand["type"] != "number" or not fits_immediate(operand["value"]):
+        return False
+    return op != "div" or operand["value"] >= 0
 
-    code.append(("call", ("PENDING", fname)))
-    return code
-
-def compile_expr(expr, ctx):
-    if expr["type"] == "binop":
-        return compile_binop_expr(expr, ctx)
-    if expr["type"] == "number":
-        addr = ctx.allocate_literal(expr["value"])
-        return [("load", addr)]
-    if expr["type"] == "var":
-        addr = ctx.lookup_var(expr["name"])
-        return [("load", addr)]
-    if expr["type"] == "string":
-        base = ctx.store_string(expr["value"])
-        addr_holder = ctx.allocate_temp()
-        ctx.literal_pool[addr_holder] = base
-        return [("load", addr_holder)]
-    if expr["type"] == "funcall":
-        return compile_funcall_expr(expr, ctx)
-
-    raise NotImplementedError(f"Unknown expr type: {expr['type']}")
 
+def compile_binop_expr(expr, ctx):
+    op = BINOP_INSTRUCTIONS[expr["op"]]
+    right = expr["right"]
+    compile_expr(expr["left"], ctx)
+    if immediate_operand(op, right):
+        ctx.emit(IMMEDIATE_OPS[op], right["value"])
+        return
+    ctx.emit("push")
+    compile_expr(right, ctx)
+    tmp = ctx.allocate_temp()
+    ctx.emit("store", tmp)
+    ctx.emit("pop")
+    ctx.emit(op, tmp)
+    # the right operand is fully evaluated before tmp is written, so tmp is dead after the op
+    ctx.free_temp(tmp)
 
-def compile_funcall(stmt, ctx):
-    fname = stmt["name"]
-    args = stmt["args"]
-    param_names = ctx.functions[fname]["params"]
 
-    code = []
+def compile_funcall(expr, ctx):
+    # parameter slots may belong to a function from another unit, so they are symbols for the linker
+    for i, arg_expr in enumerate(expr["args"]):
+        compile_expr(arg_expr, ctx)
+        ctx.emit("store", ("PARAM", expr["name"], i))
+    # a tail call leaves the callee's ret to return straight to our caller
+    op = "jmp" if id(expr) in ctx.tail_calls else "call"
+    ctx.emit(op, ("PENDING", expr["name"]))
 
-    for arg_expr, param in zip(args, param_names):
-        code += compile_expr(arg_expr, ctx)
-        code += [("store", ctx.lookup_var(param["name"]))]
 
-    code.append(("call", ("PENDING", fname)))
+def compile_number(value, ctx):
+    """Small constants travel in the instruction word; the rest still come from the literal pool."""
+    if fits_immediate(value):
+        ctx.emit("load_imm", value)
+    else:
+        ctx.emit("load", ctx.allocate_literal(value))
 
-    return code
 
+def compile_expr(expr, ctx):
+    if expr["type"] == "binop":
+        compile_binop_expr(expr, ctx)
+    elif expr["type"] == "number":
+        compile_number(expr["value"], ctx)
+    elif expr["type"] == "var":
+        ctx.emit("load", ctx.lookup_var(expr["name"]))
+    elif expr["type"] == "string":
+        base = ctx.store_string(expr["value"])
+        addr_holder = ctx.allocate_static()
+        ctx.literal_pool[addr_holder] = base
+        ctx.address_words.add(addr_holder)
+        ctx.emit("load", addr_holder)
+    elif expr["type"] == "funcall":
+        compile_funcall(expr, ctx)
+    else:
+        raise NotImplementedError(f"Unknown expr type: {expr['type']}")
 
 
 def compile_if(stmt, ctx):
-    cond_code = compile_expr(stmt["cond"], ctx)
+    compile_expr(stmt["cond"], ctx)
     jump_instr = resolve_jump_op(stmt["cond"])
-    code = []
-    code += cond_code
+    else_label = ctx.new_label()
+    end_label = ctx.new_label()
     if stmt["then"] is not None:
-        then_code = compile_stmt(stmt["then"], ctx)
-        code += [(jump_instr, len(then_code) + 2)]
-        code += then_code
-    else_code = compile_stmt(stmt["else"], ctx) if stmt.get("else") else []
-    code += [(jump_instr, len(else_code) + 1)]
-    code += else_code
-    return code
+        ctx.emit(jump_instr, else_label)
+        compile_stmt(stmt["then"], ctx)
+    ctx.emit(jump_instr, end_label)
+    ctx.place(else_label)
+    if stmt.get("else"):
+        compile_stmt(stmt["else"], ctx)
+    ctx.place(end_label)
 
 
 
 def compile_read_line(expr, ctx):
     addr = ctx.lookup_var(expr["value"]["name"])
     ptr = ctx.allocate_temp()
-    newline = ctx.allocate_literal(ord("\n"))
-    one = ctx.allocate_literal(1)
-    zero = ctx.allocate_literal(0)
-    temp_indirect = ctx.allocate_literal(2)
+    cursor = ctx.allocate_temp()
     tmp_char = ctx.allocate_temp()
-    code = [("load", zero), ("store", ptr)]
-    code += [("load", addr), ("add", one), ("store", addr)]
-    code += [("in", 0)]
-    code += [("store", tmp_char)]
-    code += [("load", tmp_char), ("sub", newline)]
-    code += [("jz", 11)]
-    code += [("load", ptr), ("add", addr), ("add", one), ("store", temp_indirect)]
-    code += [("load", tmp_char), ("store_addr", temp_indirect)]
-    code += [("load", ptr), ("add", one), ("store", ptr)]
-    code += [("jmp", -14)]
-    code += [("load", ptr), ("store_addr", addr)]
-    return code
+    loop, done = ctx.new_label(), ctx.new_label()
+    ctx.emit("load_imm", 0)
+    ctx.emit("store", ptr)
+    ctx.emit("load", addr)
+    ctx.emit("add_imm", 1)
+    ctx.emit("store", addr)
+    ctx.place(loop)
+    ctx.emit("in", 0)
+    ctx.emit("store", tmp_char)
+    ctx.emit("load", tmp_char)
+    ctx.emit("sub_imm", ord("\n"))
+    ctx.emit("jz", done)
+    ctx.emit("load", ptr)
+    ctx.emit("add", addr)
+    ctx.emit("add_imm", 1)
+    ctx.emit("store", cursor)
+    ctx.emit("load", tmp_char)
+    ctx.emit("store_addr", cursor)
+    ctx.emit("load", ptr)
+    ctx.emit("add_imm", 1)
+    ctx.emit("store", ptr)
+    ctx.emit("jmp", loop)
+    ctx.place(done)
+    ctx.emit("load", ptr)
+    ctx.emit("store_addr", addr)
+    ctx.free_temp(ptr, cursor, tmp_char)
 
 
 def compile_print_var(ctx, var_expr=None, address=None):
-    code = []
     if address is None:
         var_name = var_expr["name"]
         addr = ctx.lookup_var(var_name)
 
         if var_name in ctx.array_sizes:
-            return compile_print_var(ctx, address=addr)
+            compile_print_var(ctx, address=addr)
+            return
 
-        return [("load", addr), ("out", 0)]
+        ctx.emit("load", addr)
+        ctx.emit("out", 0)
+        return
 
 
     addr = address
     ptr = ctx.allocate_temp()
     end = ctx.allocate_temp()
     temp_len = ctx.allocate_temp()
-    one = ctx.allocate_literal(1)
-
-    code += [("load_addr", addr), ("store", temp_len)]
-    code += [("load", addr), ("add", one), ("store", ptr)]
-    code += [("load", addr), ("add", one), ("add", temp_len), ("store", end)]
-    code += [("load", ptr), ("sub", end), ("jz", 7)]
-    code += [("load_addr", ptr), ("out", 0)]
-    code += [("load", ptr), ("add", one), ("store", ptr)]
-    code += [("jmp", -12)]
-    return code
+    loop, done = ctx.new_label(), ctx.new_label()
+
+    ctx.emit("load_addr", addr)
+    ctx.emit("store", temp_len)
+    ctx.emit("load", addr)
+    ctx.emit("add_imm", 1)
+    ctx.emit("store", ptr)
+    ctx.emit("load", addr)
+    ctx.emit("add_imm", 1)
+    ctx.emit("add", temp_len)
+    ctx.emit("store", end)
+    ctx.place(loop)
+    ctx.emit("load", ptr)
+    ctx.emit("sub", end)
+    ctx.emit("jz", done)
+    ctx.emit("load_addr", ptr)
+    ctx.emit("out", 0)
+    ctx.emit("load", ptr)
+    ctx.emit("add_imm", 1)
+    ctx.emit("store", ptr)
+    ctx.emit("jmp", loop)
+    ctx.place(done)
+    ctx.free_temp(ptr, end, temp_len)
 
 
 def compile_print_string(expr, ctx):
     val = expr["value"]
     if val["type"] != "string":
-        return compile_print_var(ctx, var_expr=val)
+        compile_print_var(ctx, var_expr=val)
+        return
     s = val["value"]
     addr = ctx.store_string(s)
-    return compile_print_var(ctx, address=addr)
+    compile_print_var(ctx, address=addr)
 
 def resolve_jump_op(cond):
     op = cond["op"]
@@ -212,21 +282,24 @@ def resolve_jump_op(cond):
     }[op]
 
 def compile_while(stmt, ctx):
-    start_idx = len(ctx.code)
-    cond_code = compile_expr(stmt["cond"], ctx)
-    jump_instr = resolve_jump_op(stmt["cond"])
-    code = cond_code
-    code += [(jump_instr, 0)]
-    jmp_idx = len(ctx.code) + len(code) - 1
+    head, exit_label = ctx.new_label(), ctx.new_label()
+    ctx.place(head)
+    compile_expr(stmt["cond"], ctx)
+    ctx.emit(resolve_jump_op(stmt["cond"]), exit_label)
     for s in stmt["body"]:
-        code.extend(compile_stmt(s, ctx))
-    code.append(("jmp", start_idx - len(ctx.code) - 1 - len(code)))
-    ctx.code.extend(code)
-    after_body = len(ctx.code)
-    ctx.code[jmp_idx] = (jump_instr, after_body - jmp_idx)
-    return []
+        compile_stmt(s, ctx)
+    ctx.emit("jmp", head)
+    ctx.place(exit_label)
 
 
+def compile_seq(stmt, ctx):
+    """Statements left by constant folding in place of an if/while with a known condition."""
+    for child in stmt["body"]:
+        if child["type"] == "number":
+            compile_expr(child, ctx)
+        else:
+            compile_stmt(child, ctx)
+
 
 def compile_stmt(stmt, ctx):
     handlers = {
@@ -237,12 +310,20 @@ def compile_stmt(stmt, ctx):
         "funcall": compile_funcall,
         "if": compile_if,
         "while": compile_while,
-        "defunc": lambda s, ctx: []
+        "seq": compile_seq,
+        "defunc": lambda s, ctx: None
     }
     handler = handlers.get(stmt["type"])
-    if handler:
-        return handler(stmt, ctx)
-    raise NotImplementedError(f"Unknown stmt type: {stmt['type']}")
+    if handler is None:
+        raise NotImplementedError(f"Unknown stmt type: {stmt['type']}")
+    start = len(ctx.code)
+    handler(stmt, ctx)
+    record_span(stmt, start, ctx)
+
+
+def record_span(stmt, start, ctx):
+    if stmt.get("span") and len(ctx.code) > start:
+        ctx.source_map.append(source_range(start, len(ctx.code), stmt["span"], ctx.current_function))
 
 
 def compile_var_stmt(stmt, ctx):
@@ -251,80 +332,187 @@ def compile_var_stmt(stmt, ctx):
     expr = stmt.get("expr")
     if expr and expr["type"] == "number":
         ctx.literal_pool[addr] = expr["value"]
-        ctx.var_is_number[stmt["name"]] = True
-        return [*compile_expr(expr, ctx), ("store", addr)]
-    if expr and expr["type"] == "binop":
-        left = expr["left"]
-        right = expr["right"]
-        if left["type"] == "number" and right["type"] == "number":
-            op = expr["op"]
-            result = eval(f"{left['value']} {op} {right['value']}")
-            ctx.literal_pool[addr] = result
-            ctx.var_is_number[stmt["name"]] = True
-            return [*compile_expr(expr, ctx), ("store", addr)]
-    return [*compile_expr(expr, ctx), ("store", addr)] if expr else []
+    if expr:
+        compile_expr(expr, ctx)
+        ctx.emit("store", addr)
 
 
 def compile_set_stmt(stmt, ctx):
     addr = ctx.lookup_var(stmt["name"])
-    return [*compile_expr(stmt["expr"], ctx), ("store", addr)]
+    compile_expr(stmt["expr"], ctx)
+    ctx.emit("store", addr)
 
 
 def compile_print_string_stmt(stmt, ctx):
     val = stmt["value"]
     if val["type"] == "var":
-        return compile_print_var(ctx, var_expr=val)
-    return compile_print_string(stmt, ctx)
+        compile_print_var(ctx, var_expr=val)
+    else:
+        compile_print_string(stmt, ctx)
 
 
 def compile_read_line_stmt(stmt, ctx):
-    return compile_read_line(stmt, ctx)
+    compile_read_line(stmt, ctx)
 
 def collect_functions(ast_list, ctx):
     for node in ast_list:
         if node["type"] == "defunc":
-            ctx.define_function(node["name"], node["params"], node["body"])
+            ctx.define_function(node["name"], node["params"], node["body"], node.get("span"))
 
-def declare_func_params(f, ctx):
+def declare_func_params(fname, f, ctx):
+    slots = []
     for param in f["params"]:
         if isinstance(param, dict) and "name" in param:
-            ctx.define_var(param["name"])
+            slots.append(ctx.define_var(param["name"]))
         else:
-            ctx.define_var(param)
+            slots.append(ctx.define_var(param))
+    ctx.function_params[fname] = slots
 
 def compile_func_body(f, ctx):
+    start = len(ctx.code)
     for stmt in f["body"]:
         if stmt["type"] == "var":
             compile_var_stmt(stmt, ctx)
+    # the first pass only reserves the locals, its code is dropped
+    ctx.truncate(start)
     for stmt in f["body"]:
         if stmt["type"] in ("binop", "number", "var", "string", "funcall"):
-            ctx.code.extend(compile_expr(stmt, ctx))
+            start = len(ctx.code)
+            compile_expr(stmt, ctx)
+            record_span(stmt, start, ctx)
         else:
-            ctx.code.extend(compile_stmt(stmt, ctx))
+            compile_stmt(stmt, ctx)
+
+def mark_tail_calls(stmt, ctx):
+    """Remember calls after which the function only reaches ``ret``; they are compiled to ``jmp``."""
+    if stmt["type"] == "funcall":
+        ctx.tail_calls.add(id(stmt))
+    elif stmt["type"] == "if":
+        # then is followed by a jump that may fall into else, so it is a tail only without else
+        branch = stmt["else"] or stmt["then"]
+        if branch is not None:
+            mark_tail_calls(branch, ctx)
+    elif stmt["type"] == "seq" and stmt["body"]:
+        mark_tail_calls(stmt["body"][-1], ctx)
+
 
 def compile_all_functions(ctx):
     for fname, f in ctx.functions.items():
         if ctx.function_addrs[fname] is None:
             ctx.function_addrs[fname] = len(ctx.code)
-        declare_func_params(f, ctx)
+        if f["body"]:
+            mark_tail_calls(f["body"][-1], ctx)
+        ctx.current_function = fname
+        declare_func_params(fname, f, ctx)
         compile_func_body(f, ctx)
-        ctx.code.append(("ret",))
-
-
-def patch_pending_calls(ctx):
-    for idx, instr in enumerate(ctx.code):
-        if instr[0] == "call" and isinstance(instr[1], tuple) and instr[1][0] == "PENDING":
-            fname = instr[1][1]
-            addr = ctx.function_addrs[fname]
-            rel = addr - idx
-            ctx.code[idx] = ("call", rel)
+        ctx.emit("ret")
+        ctx.function_ranges[fname] = (ctx.function_addrs[fname], len(ctx.code))
+        record_span(f, ctx.function_addrs[fname], ctx)
+    ctx.current_function = None
+
+
+def jump_targets(ctx):
+    return {*ctx.labels, *ctx.function_addrs.values()}
+
+
+def match_leaf_binop(code, i):
+    """``push; load R; store tmp; pop; OP tmp`` -> ``OP R``: ACC already holds the left operand.
+
+    Not for div: tmp holds R as an unsigned word, while R itself may still hold the signed value from the
+    image, and div (unlike add/sub/mul) does not agree on the two.
+    """
+    window = code[i:i + 5]
+    if len(window) < 5 or window[0] != ("push",) or window[3] != ("pop",):
+        return None
+    load, store, op = window[1], window[2], window[4]
+    if load[0] != "load" or store[0] != "store" or op[0] not in ("add", "sub", "mul"):
+        return None
+    if op[1] != store[1] or load[1] == store[1]:
+        return None
+    return [(op[0], load[1])]
+
+
+def match_store_load(code, i):
+    """``store X; load X`` -> ``store X``: ACC already holds X."""
+    window = code[i:i + 2]
+    if len(window) == 2 and window[0][0] == "store" and window[1] == ("load", window[0][1]):
+        return [window[0]]
+    return None
+
+
+def match_recompute(code, i):
+    """``load A; OP B; store P; load A; OP B`` -> ``load A; OP B; store P`` when P is neither A nor B."""
+    window = code[i:i + 5]
+    if len(window) < 5 or window[0][0] != "load" or window[2][0] != "store" or window[3:] != window[:2]:
+        return None
+    op = window[1]
+    if op[0] not in ("add", "sub", "mul", "div", *IMMEDIATE_OPS.values()) or window[2][1] in (window[0][1], op[1]):
+        return None
+    return window[:3]
+
+
+PEEPHOLE_RULES = ((match_leaf_binop, 5), (match_store_load, 2), (match_recompute, 5))
+
+
+def rewrite(code, targets):
+    """Apply the peephole rules once; return the new code and old index -> new index (one past the end included).
+
+    A window is only rewritten when none of its instructions but the first is a jump target.
+    """
+    new_code: list[tuple[object, ...]] = []
+    new_index: list[int] = []
+    i = 0
+    while i < len(code):
+        for rule, size in PEEPHOLE_RULES:
+            replacement = rule(code, i)
+            if replacement is not None and not targets.intersection(range(i + 1, i + size)):
+                break
+        else:
+            replacement, size = [code[i]], 1
+        # kept instructions keep their place, dropped ones map past the replacement
+        base = len(new_code)
+        if size == 1:
+            new_index.append(base)
+        else:
+            new_index += [base + min(k, len(replacement)) for k in range(size)]
+        new_code += replacement
+        i += size
+    new_index.append(len(new_code))
+    return new_code, new_index
+
+
+def peephole(ctx):
+    """Rewrite ``ctx.code`` in place and move labels, relocations and every recorded address along.
+
+    Jumps are still symbolic here, so only their targets move; the rules never drop a jump or a call.
+    """
+    new_code, new_index = rewrite(ctx.code, jump_targets(ctx))
+    ctx.code[:] = new_code
+    ctx.labels = [new_index[pos] for pos in ctx.labels]
+    ctx.relocations = [new_index[idx] for idx in ctx.relocations]
+    for fname, addr in ctx.function_addrs.items():
+        ctx.function_addrs[fname] = new_index[addr]
+    for fname, (start, end) in ctx.function_ranges.items():
+        ctx.function_ranges[fname] = (new_index[start], new_index[end])
+    for entry in ctx.source_map:
+        entry["start"], entry["end"] = new_index[entry["start"]], new_index[entry["end"]]
+
+
+def resolve_labels(ctx):
+    """Turn label operands into offsets relative to their instruction; calls and parameter slots stay for the linker."""
+    unresolved = []
+    for idx in ctx.relocations:
+        op, operand = ctx.code[idx]
+        if operand[0] == "LABEL":
+            ctx.code[idx] = (op, ctx.labels[operand[1]] - idx)
+        else:
+            unresolved.append(idx)
+    ctx.relocations = unresolved
 
-def compile_program(ast_list):
+def compile_unit(ast_list):
+    """Compile one source: its functions, then its top-level code starting at ``ctx.main_start``."""
     ctx = CompileContext()
 
-    main_jump_placeholder = len(ctx.code)
-    ctx.code.append(("jmp", 0))
-
     collect_functions(ast_list, ctx)
 
     for fname in ctx.functions:
@@ -332,16 +520,55 @@ def compile_program(ast_list):
 
     compile_all_functions(ctx)
 
-    main_start = len(ctx.code)
+    main_label = ctx.new_label()
+    ctx.place(main_label)
     for node in ast_list:
         if node["type"] != "defunc":
-            ctx.code.extend(compile_stmt(node, ctx))
+            compile_stmt(node, ctx)
 
-    ctx.code.append(("halt",))
-    patch_pending_calls(ctx)
-    ctx.code[main_jump_placeholder] = ("jmp", main_start)
+    peephole(ctx)
+    resolve_labels(ctx)
+    ctx.main_start = ctx.labels[main_label[1]]
+    return ctx
 
-    return ctx.code, ctx
+
+def unit_object(ctx, source_path):
+    """Object file contents for a compiled unit, see ``linker``."""
+    return {
+        "version": OBJECT_VERSION,
+        "source": source_path,
+        "text": ctx.code,
+        "main": ctx.main_start,
+        "relocations": ctx.relocations,
+        "exports": ctx.function_addrs,
+        "params": ctx.function_params,
+        "functions": {name: list(bounds) for name, bounds in ctx.function_ranges.items()},
+        "ranges": ctx.source_map,
+        "data": sorted(collect_data_section(ctx).items()),
+        "data_size": ctx.next_addr,
+        "data_relocations": sorted(ctx.address_words),
+    }
+
+
+def compile_file(input_path):
+    with open(input_path, encoding="utf-8") as f:
+        forms = LispParser(f).forms()
+        try:
+            ctx = compile_unit(fold_program([ast_to_expr(form) for form in forms]))
+        except RecursionError as e:
+            raise NestingTooDeepError(input_path, sys.getrecursionlimit()) from e
+    return unit_object(ctx, input_path)
+
+
+def source_range(start, end, span, function):
+    line, col, end_line, end_col = span
+    return {"start": start, "end": end, "line": line, "col": col, "end_line": end_line, "end_col": end_col,
+            "function": function}
+
+
+def write_source_map(path, source_map):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(source_map, f)
 
 def collect_data_section(ctx):
     data = {}
@@ -354,33 +581,28 @@ def collect_data_section(ctx):
 
 
 def write_binary_file(path, code, data):
+    words = []
+    hex_lines = []
+    for addr, instr in enumerate(code):
+        opcode = OPCODE_TABLE[instr[0]]
+        arg = instr[1] if len(instr) > 1 else 0
+        word = (opcode << 27) | (arg & 0x07FFFFFF)
+        words.append(word)
+        hex_word = f"{word:08X}"
+        mnemonic = instr[0]
+        if len(instr) > 1:
+            mnemonic += f" {arg}"
+        hex_lines.append(f"{addr:04} - {hex_word} - {mnemonic}")
     with open(path, "wb") as f:
-        f.write(struct.pack(">I", len(code)))
-        hex_lines = []
-        for addr, instr in enumerate(code):
-            opcode = OPCODE_TABLE[instr[0]]
-            arg = instr[1] if len(instr) > 1 else 0
-            word = (opcode << 27) | (arg & 0x07FFFFFF)
-            f.write(struct.pack(">I", word))
-            hex_word = f"{word:08X}"
-            mnemonic = instr[0]
-            if len(instr) > 1:
-                mnemonic += f" {arg}"
-            hex_lines.append(f"{addr:04} - {hex_word} - {mnemonic}")
-        for addr, val in sorted(data.items()):
-            f.write(struct.pack(">Ii", addr, val))
-        with open(path+".hex", "w", encoding="utf-8") as fhex:
-            fhex.write("\n".join(hex_lines))
+        write_image(f, words, data)
+    with open(path+".hex", "w", encoding="utf-8") as fhex:
+        fhex.write("\n".join(hex_lines))
 
 
 def main(input_path, output_path):
-    with open(input_path, encoding="utf-8") as f:
-        source = f.read()
-    parser = LispParser(source)
-    ast = [ast_to_expr(e) for e in parser.parse_program()]
-    code, ctx = compile_program(ast)
-    data = collect_data_section(ctx)
+    code, data, source_map = link([compile_file(input_path)])
     write_binary_file(output_path, code, data)
+    write_source_map(output_path + ".map", source_map)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+import math
+
+from cpu_sim import ALU_OPS, CPU
+from instrucrions import OPCODE_TABLE
+from microcode_memory import MICROPROGRAM_LEN, microprogram_path
+
+MASK = 0xFFFFFFFF
+
+
+class FastCPU(CPU):
+    """Instruction-level engine: one Python call per macro instruction.
+
+    Ticks are charged from the microprogram lengths, so ``macro_cnt`` and the
+    final machine state match the microcoded ``CPU``. Only FETCH records can be
+    traced.
+    """
+
+    DEFAULT_TRACE_LEVEL = "off"
+    TRACE_LEVELS = ("off", "macro")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.handlers = [self._op_microcoded] * 32
+        self.ticks = [(1, 1)] * 32
+        self.exits = {}
+        for name, opcode in OPCODE_TABLE.items():
+            uaddr = self.LUT[opcode]
+            handler = getattr(self, "_op_" + name)
+            if self.profile is not None:
+                handler = self.profile.wrap_handler(opcode, handler)
+            self.handlers[opcode] = handler
+            not_taken, taken = MICROPROGRAM_LEN[opcode]
+            self.ticks[opcode] = (1 + not_taken, 1 + taken)
+            self.exits[opcode] = tuple(
+                (path[-1], next_u) for path, next_u in (microprogram_path(uaddr), microprogram_path(uaddr, True))
+            )
+
+    def finish_microprogram(self):
+        """Complete a macro instruction left half-way by the microcoded engine (e.g. a restored snapshot)."""
+        r = self.registers
+        while not (self.fetch_pending or r.halted):
+            self.step()
+
+    def run(self, limit=math.inf):
+        self.finish_microprogram()
+        r = self.registers
+        instr = self.memory.instr
+        handlers = self.handlers
+        ticks = self.ticks
+        trace_fetch = self.trace_fetch
+        last = None
+        while not r.halted and r.macro_cnt < limit:
+            if r.IP >= len(instr):
+                r.halted = True
+                break
+            r.IR = word = instr[r.IP]
+            arg = word & 0x07FFFFFF
+            r.ARG = arg - (1 << 27) if arg & (1 << 26) else arg
+            opcode = (word >> 27) & 0x1F
+            if trace_fetch is not None:
+                trace_fetch(r.macro_cnt + 1, r.IP, word)
+            taken = handlers[opcode](r)
+            r.macro_cnt += ticks[opcode][taken]
+            last = (opcode, taken)
+        self.fetch_pending = not r.halted
+        self._sync_upc(last)
+        if r.halted:
+            self.finish()
+
+    def _sync_upc(self, last):
+        if last is None or last[0] not in self.exits:
+            return
+        self.last_uPC, self.registers.uPC = self.exits[last[0]][last[1]]
+
+    def _set_acc(self, r, value):
+        r.ACC = value
+        r.Z = int(value == 0)
+        r.N = (value >> 31) & 1
+
+    def _read_arg(self, r):
+        r.DataA = r.ARG
+        r.DR = self.memory.data.get(r.DataA, 0)
+        return r.DR
+
+    def _read_indirect(self, r):
+        r.DataA = self._read_arg(r) & MASK
+        return r.DataA
+
+    def _next_ip(self, r):
+        r.IP = (r.IP + 1) & MASK
+
+    def _alu(self, r, op):
+        self._set_acc(r, ALU_OPS[op](r.ACC, self._read_arg(r)) & MASK)
+        self._next_ip(r)
+        return False
+
+    def _jump(self, r):
+        ip = r.IP
+        self._set_acc(r, ip)
+        r.IP = (ip + r.ARG) & MASK
+        return True
+
+    def _branch(self, r, taken):
+        if taken:
+            return self._jump(r)
+        self._next_ip(r)
+        return False
+
+    def _op_microcoded(self, r):
+        r.uPC = self.LUT[(r.IR >> 27) & 0x1F]
+        self.fetch_pending = False
+        self.finish_microprogram()
+        return False
+
+    def _op_halt(self, r):
+        r.halted = True
+        return False
+
+    def _op_load(self, r):
+        self._set_acc(r, self._read_arg(r) & MASK)
+        self._next_ip(r)
+        return False
+
+    def _op_load_addr(self, r):
+        r.DR = self.memory.data.get(self._read_indirect(r), 0)
+        self._set_acc(r, r.DR & MASK)
+        self._next_ip(r)
+        return False
+
+    def _op_store(self, r):
+        r.DataA = r.ARG
+        self.memory.data[r.DataA] = r.ACC & MASK
+        self._next_ip(r)
+        return False
+
+    def _op_store_addr(self, r):
+        self.memory.data[self._read_indirect(r)] = r.ACC & MASK
+        self._next_ip(r)
+        return False
+
+    def _op_push(self, r):
+        r.SP = r.DataA = (r.SP - 1) & MASK
+        self.memory.data[r.DataA] = r.ACC & MASK
+        self._next_ip(r)
+        return False
+
+    def _op_pop(self, r):
+        r.DataA = r.SP
+        r.DR = self.memory.data.get(r.DataA, 0)
+        self._set_acc(r, r.DR & MASK)
+        r.SP = (r.SP + 1) & MASK
+        self._next_ip(r)
+        return False
+
+    def _op_add(self, r):
+        return self._alu(r, 0)
+
+    def _op_sub(self, r):
+        return self._alu(r, 1)
+
+    def _op_mul(self, r):
+        return self._alu(r, 2)
+
+    def _op_div(self, r):
+        return self._alu(r, 3)
+
+    def _alu_imm(self, r, op):
+        self._set_acc(r, ALU_OPS[op](r.ACC, r.ARG) & MASK)
+        self._next_ip(r)
+        return False
+
+    def _op_load_imm(self, r):
+        self._set_acc(r, r.ARG & MASK)
+        self._next_ip(r)
+        return False
+
+    def _op_add_imm(self, r):
+        return self._alu_imm(r, 0)
+
+    def _op_sub_imm(self, r):
+        return self._alu_imm(r, 1)
+
+    def _op_mul_imm(self, r):
+        return self._alu_imm(r, 2)
+
+    def _op_div_imm(self, r):
+        return self._alu_imm(r, 3)
+
+    def _op_call(self, r):
+        r.SP = r.DataA = (r.SP - 1) & MASK
+        self.memory.data[r.DataA] = (r.IP + 1) & MASK
+        return self._jump(r)
+
+    def _op_ret(self, r):
+        r.DataA = r.SP
+        r.DR = self.memory.data.get(r.DataA, 0)
+        r.IP = r.DR & MASK
+        r.SP = (r.SP + 1) & MASK
+        return False
+
+    def _op_in(self, r):
+        ch = self.in_port.read()
+        if ch is None:
+            r.halted = True
+        else:
+            r.ACC = ch
+        self._set_acc(r, r.ACC)
+        self._next_ip(r)
+        return False
+
+    def _op_out(self, r):
+        self.out_port.write(r.ACC)
+        self._next_ip(r)
+        return False
+
+    def _op_jmp(self, r):
+        return self._jump(r)
+
+    def _op_jz(self, r):
+        return self._branch(r, r.Z == 1)
+
+    def _op_jnz(self, r):
+        return self._branch(r, r.Z == 0)
+
+    def _op_jlt(self, r):
+        return self._branch(r, r.N == 1 and r.Z != 0)
+
+    def _op_jgt(self, r):
+        return self._branch(r, r.N == 0 and r.Z != 0)
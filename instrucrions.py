@@ -22,6 +22,11 @@ class Opcode(str, Enum):
     JLT = "jlt"
     JGT = "jgt"
     HALT = "halt"
+    LOAD_IMM = "load_imm"
+    ADD_IMM = "add_imm"
+    SUB_IMM = "sub_imm"
+    MUL_IMM = "mul_imm"
+    DIV_IMM = "div_imm"
 
 OPCODE_TABLE = {
     "halt": 0b00000,
@@ -43,8 +48,28 @@ OPCODE_TABLE = {
     "jnz":  0b10001,
     "jlt":  0b10010,
     "jgt":  0b10011,
-    "store_addr": 0b10100
+    "store_addr": 0b10100,
+    "load_imm": 0b10101,
+    "add_imm": 0b10110,
+    "sub_imm": 0b10111,
+    "mul_imm": 0b11000,
+    "div_imm": 0b11001,
 }
 
 BRANCH_OPS = {Opcode.JMP.value, Opcode.JZ.value, Opcode.JNZ.value,
               Opcode.JLT.value, Opcode.JGT.value, Opcode.CALL.value}
+
+# Operand is a data memory address, so the linker moves it with the unit's data
+DATA_OPS = {Opcode.LOAD.value, Opcode.LOAD_ADR.value, Opcode.STORE.value, Opcode.STORE_ADR.value,
+            Opcode.ADD.value, Opcode.SUB.value, Opcode.MUL.value, Opcode.DIV.value}
+
+# Operand is the value itself, sign-extended from the 27-bit argument; sub_imm doubles as compare-immediate
+IMMEDIATE_OPS = {Opcode.LOAD.value: Opcode.LOAD_IMM.value, Opcode.ADD.value: Opcode.ADD_IMM.value,
+                 Opcode.SUB.value: Opcode.SUB_IMM.value, Opcode.MUL.value: Opcode.MUL_IMM.value,
+                 Opcode.DIV.value: Opcode.DIV_IMM.value}
+IMMEDIATE_MIN = -(1 << 26)
+IMMEDIATE_MAX = (1 << 26) - 1
+
+
+def fits_immediate(value):
+    return IMMEDIATE_MIN <= value <= IMMEDIATE_MAX
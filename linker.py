@@ -0,0 +1,137 @@
+import json
+
+from instrucrions import DATA_OPS
+
+OBJECT_VERSION = 1
+
+
+class UndefinedSymbolError(NameError):
+    """Call to a function (or a parameter of it) that no linked unit defines."""
+
+
+class DuplicateSymbolError(NameError):
+    """Function is defined in more than one linked unit."""
+
+
+class UnsupportedObjectError(ValueError):
+    """Object file was written by an incompatible version of the compiler."""
+
+
+# Object file (JSON) of one unit, as built by expr_to_asm.unit_object:
+#   text            instructions of the unit's functions followed by its top-level code, from "main" on;
+#                   branches inside the unit are already relative offsets
+#   relocations     indices of instructions whose operand is still a symbol: ("PENDING", function) for
+#                   call/jmp, ("PARAM", function, i) for the data slot of the i-th parameter
+#   exports         function -> text index, params: function -> data addresses of its parameters
+#   data            (address, value) pairs from address 0 of the unit, data_size addresses in total;
+#                   data_relocations are the words that hold an address themselves
+#   functions/ranges  source map of the unit
+
+
+def save_object(path, obj):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+
+
+def load_object(path):
+    with open(path, encoding="utf-8") as f:
+        obj = json.load(f)
+    if obj.get("version") != OBJECT_VERSION:
+        raise UnsupportedObjectError(path)
+    obj["text"] = [tuple(tuple(arg) if isinstance(arg, list) else arg for arg in instr) for instr in obj["text"]]
+    return obj
+
+
+class Layout:
+    """Where every unit goes: ``jmp`` to the top-level code, all functions, all top-level code in unit order, ``halt``."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.exports: dict[str, int] = {}
+        for unit, obj in enumerate(objects):
+            for name in obj["exports"]:
+                if name in self.exports:
+                    raise DuplicateSymbolError(name)
+                self.exports[name] = unit
+        self.func_base: list[int] = []
+        self.main_base: list[int] = []
+        self.data_base: list[int] = []
+        pos = 1
+        for obj in objects:
+            self.func_base.append(pos)
+            pos += obj["main"]
+        data = 0
+        for obj in objects:
+            self.main_base.append(pos)
+            pos += len(obj["text"]) - obj["main"]
+            self.data_base.append(data)
+            data += obj["data_size"]
+        self.halt = pos
+
+    def place(self, unit, idx):
+        main = self.objects[unit]["main"]
+        return self.func_base[unit] + idx if idx < main else self.main_base[unit] + idx - main
+
+    def resolve(self, operand, at):
+        kind, name, *index = operand
+        unit = self.exports.get(name)
+        if unit is None:
+            raise UndefinedSymbolError(name)
+        obj = self.objects[unit]
+        if kind == "PENDING":
+            return self.func_base[unit] + obj["exports"][name] - at
+        params = obj["params"][name]
+        if index[0] >= len(params):
+            raise UndefinedSymbolError(name, index[0])
+        return self.data_base[unit] + params[index[0]]
+
+
+def relocate_text(layout, code, unit, obj):
+    base = layout.data_base[unit]
+    for idx, instr in enumerate(obj["text"]):
+        if instr[0] in DATA_OPS and isinstance(instr[1], int):
+            instr = (instr[0], instr[1] + base)
+        code[layout.place(unit, idx)] = instr
+    for idx in obj["relocations"]:
+        at = layout.place(unit, idx)
+        op, operand = obj["text"][idx]
+        code[at] = (op, layout.resolve(operand, at))
+
+
+def relocate_data(layout, data, unit, obj):
+    base = layout.data_base[unit]
+    addresses = set(obj["data_relocations"])
+    for addr, value in obj["data"]:
+        data[base + addr] = value + base if addr in addresses else value
+
+
+def relocate_source_map(layout, unit, obj):
+    def move(entry):
+        if entry["function"] is not None:
+            start = layout.place(unit, entry["start"])
+        else:
+            start = layout.main_base[unit] + entry["start"] - obj["main"]
+        return {**entry, "start": start, "end": start + entry["end"] - entry["start"], "source": obj["source"]}
+
+    functions = {name: [layout.place(unit, start), layout.place(unit, start) + end - start]
+                 for name, (start, end) in obj["functions"].items()}
+    return functions, [move(entry) for entry in obj["ranges"]]
+
+
+def link(objects):
+    """Link unit objects into ``(code, data, source_map)``; the first unit's top-level code runs first."""
+    layout = Layout(objects)
+    code: list[tuple[object, ...]] = [("halt",)] * (layout.halt + 1)
+    code[0] = ("jmp", layout.main_base[0] if objects else layout.halt)
+    data: dict[int, int] = {}
+    source_map: dict[str, object] = {"source": objects[0]["source"] if objects else None}
+    functions, ranges = {}, []
+    for unit, obj in enumerate(objects):
+        relocate_text(layout, code, unit, obj)
+        relocate_data(layout, data, unit, obj)
+        unit_functions, unit_ranges = relocate_source_map(layout, unit, obj)
+        functions.update(unit_functions)
+        ranges += unit_ranges
+    ranges.sort(key=lambda entry: (entry["start"], -entry["end"]))
+    source_map.update(functions=functions, ranges=ranges)
+    return code, data, source_map
@@ -4,25 +4,25 @@ def encode_u(
     ip_sel=0, alu=0, cond=0, next_addr=0
 ):
     return (
-            ((halted & 1) << 26) |
-            ((acc_l & 1) << 25) |
-            ((dal & 1) << 24) |
-            ((mem & 1) << 23) |
-            ((sp_l & 1) << 22) |
-            ((dr & 1) << 21) |
-            ((out & 1) << 20) |
-            ((ip_l & 1) << 19) |
-            ((adr_sel & 1) << 18) |
-            ((io_sel & 1) << 17) |
-            ((cla & 0b11) << 15) |
-            ((cld & 0b11) << 13) |
-            ((ip_sel & 1) << 12) |
-            ((alu & 0b111) << 9) |
-            ((cond & 0b111) << 6) |
-            (next_addr & 0x3F)
+            ((halted & 1) << 27) |
+            ((acc_l & 1) << 26) |
+            ((dal & 1) << 25) |
+            ((mem & 1) << 24) |
+            ((sp_l & 1) << 23) |
+            ((dr & 1) << 22) |
+            ((out & 1) << 21) |
+            ((ip_l & 1) << 20) |
+            ((adr_sel & 1) << 19) |
+            ((io_sel & 1) << 18) |
+            ((cla & 0b11) << 16) |
+            ((cld & 0b11) << 14) |
+            ((ip_sel & 1) << 13) |
+            ((alu & 0b111) << 10) |
+            ((cond & 0b111) << 7) |
+            (next_addr & 0x7F)
     )
 
-ROM = [0] * 64
+ROM = [0] * 128
 
 # FETCH
 ROM[0] = encode_u(ip_l=1)
@@ -122,6 +122,14 @@ ROM[61] = encode_u(cla=0, cld=1, alu=0, dal=1)
 ROM[62] = encode_u(mem=1)
 ROM[63] = encode_u(cld=0b10, alu=0b100, ip_l=1, cond=1)
 
+# Immediates: the right ALU input is ARG (cld=0b11), IP+1 and the return to FETCH are shared
+ROM[64] = encode_u(cld=0b10, alu=0b100, ip_l=1, cond=1, next_addr=0)
+ROM[65] = encode_u(cld=0b11, alu=0b000, acc_l=1, cond=1, next_addr=64)  # LOAD_IMM
+ROM[66] = encode_u(cla=1, cld=0b11, alu=0b000, acc_l=1, cond=1, next_addr=64)  # ADD_IMM
+ROM[67] = encode_u(cla=1, cld=0b11, alu=0b001, acc_l=1, cond=1, next_addr=64)  # SUB_IMM
+ROM[68] = encode_u(cla=1, cld=0b11, alu=0b010, acc_l=1, cond=1, next_addr=64)  # MUL_IMM
+ROM[69] = encode_u(cla=1, cld=0b11, alu=0b011, acc_l=1, cond=1, next_addr=64)  # DIV_IMM
+
 OPCODE_TO_UADDR = [0] * 32
 OPCODE_TO_UADDR[0x00] = 54  # HALT
 OPCODE_TO_UADDR[0x01] = 55  # LOAD_ADDR
@@ -143,3 +151,28 @@ OPCODE_TO_UADDR[0x11] = 48  # JNZ
 OPCODE_TO_UADDR[0x12] = 50  # JLT
 OPCODE_TO_UADDR[0x13] = 52  # JGT
 OPCODE_TO_UADDR[0x14] = 60  # STORE_ADDR
+OPCODE_TO_UADDR[0x15] = 65  # LOAD_IMM
+OPCODE_TO_UADDR[0x16] = 66  # ADD_IMM
+OPCODE_TO_UADDR[0x17] = 67  # SUB_IMM
+OPCODE_TO_UADDR[0x18] = 68  # MUL_IMM
+OPCODE_TO_UADDR[0x19] = 69  # DIV_IMM
+
+
+def microprogram_path(uaddr, taken=False):
+    path = []
+    upc = uaddr
+    while True:
+        path.append(upc)
+        uword = ROM[upc]
+        cond = (uword >> 7) & 0b111
+        jump = cond == 0b001 or (cond != 0 and taken)
+        upc = uword & 0x7F if jump else (upc + 1) & 0x7F
+        if (uword >> 27) & 1 or upc == 0:
+            return path, upc
+
+
+# Microprogram length per opcode, FETCH excluded: (branch not taken, branch taken)
+MICROPROGRAM_LEN = [
+    (len(microprogram_path(uaddr)[0]), len(microprogram_path(uaddr, taken=True)[0]))
+    for uaddr in OPCODE_TO_UADDR
+]
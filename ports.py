@@ -0,0 +1,152 @@
+import sys
+
+
+class UnseekableStreamError(OSError):
+    """Input stream cannot be repositioned (stdin, pipes or no input at all)."""
+
+
+class InputPort:
+    """IN device: characters are read lazily from a file or pipe in chunks.
+
+    ``read`` returns the next character code, or None once the stream is exhausted.
+    """
+
+    def __init__(self, path=None, stream=None, chunk_size=1 << 16):
+        self.path = path
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.consumed = 0
+        self.eof = path is None and stream is None
+
+    def _open(self):
+        if self.path == "-":
+            self.stream = sys.stdin
+        else:
+            self.stream = open(self.path, encoding="utf-8")
+
+    def _fill(self):
+        if self.eof:
+            return False
+        if self.stream is None:
+            self._open()
+        self.buf = self.stream.read(self.chunk_size)
+        self.pos = 0
+        if not self.buf:
+            self.close()
+            return False
+        return True
+
+    def read(self):
+        if self.pos >= len(self.buf) and not self._fill():
+            return None
+        ch = self.buf[self.pos]
+        self.pos += 1
+        self.consumed += 1
+        return ord(ch)
+
+    def seek(self, consumed):
+        """Reposition the stream so that ``consumed`` characters have been read."""
+        if consumed == self.consumed:
+            return
+        if self.path in (None, "-"):
+            raise UnseekableStreamError(consumed)
+        self.close()
+        self.stream = None
+        self.eof = False
+        self.buf = ""
+        self.pos = 0
+        self.consumed = 0
+        while self.consumed < consumed and self._fill():
+            step = min(len(self.buf), consumed - self.consumed)
+            self.pos = step
+            self.consumed += step
+
+    def close(self):
+        self.eof = True
+        if self.stream is not None and self.stream is not sys.stdin:
+            self.stream.close()
+
+
+class OutputPort:
+    """OUT device: every word is echoed to stdout and streamed to the output file.
+
+    The file holds the same ``[a, b, ...]`` list the simulator always wrote, but it
+    is produced incrementally through a buffered file. Without a file the words
+    are collected in ``values`` instead. Words read back from the file are cached
+    together with the byte offset they end at, so ``words`` only parses the tail.
+    """
+
+    def __init__(self, path=None, echo=True):
+        self.path = path
+        self.echo = echo
+        self.file = None
+        self.count = 0
+        self.closed = False
+        self.values: list[int] | None = [] if path is None else None
+        self.read_back: list[int] = []
+        self.read_offset = 0
+
+    def write(self, value):
+        if self.echo:
+            print(f"[OUT]: {value}")
+        if self.values is not None:
+            self.values.append(value)
+        else:
+            if self.file is None:
+                self.file = open(self.path, "w", encoding="utf-8")
+            self.file.write(f", {value}" if self.count else f"[{value}")
+        self.count += 1
+
+    def close(self):
+        if self.path is None or self.closed:
+            return
+        self.closed = True
+        if self.file is None:
+            self.file = open(self.path, "w", encoding="utf-8")
+            self.file.write("[")
+        self.file.write("]")
+        self.file.close()
+        self.file = None
+
+    def words(self):
+        """Every word written so far: the collected values, or the ones read back from the output file."""
+        if self.values is not None:
+            return self.values
+        if not self.count:
+            return []
+        if self.file is not None:
+            self.file.flush()
+        with open(self.path, "rb") as f:
+            f.seek(self.read_offset)
+            tail = f.read()
+        self.read_offset += len(tail)
+        self.read_back.extend(int(word) for word in tail.decode("ascii").strip("[]").split(", ") if word)
+        return self.read_back
+
+    def snapshot(self):
+        """Return the words written so far: the file text produced for them, or the collected values."""
+        state = {"count": self.count, "text": "", "values": None}
+        if self.values is not None:
+            state["values"] = list(self.values)
+        elif self.file is not None:
+            self.file.flush()
+            with open(self.path, encoding="utf-8") as f:
+                state["text"] = f.read()
+        return state
+
+    def restore(self, state):
+        self.count = state["count"]
+        self.closed = False
+        if self.values is not None:
+            self.values[:] = state["values"] or []
+            return
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.read_back = []
+        self.read_offset = 0
+        if self.path is not None and state["text"]:
+            self.file = open(self.path, "w", encoding="utf-8")
+            self.file.write(state["text"])
@@ -0,0 +1,182 @@
+import json
+from collections import Counter
+
+from instrucrions import OPCODE_TABLE
+from microcode_memory import MICROPROGRAM_LEN, OPCODE_TO_UADDR, ROM, microprogram_path
+
+OPCODE_NAMES = {opcode: name for name, opcode in OPCODE_TABLE.items()}
+PROFILE_FORMATS = ("json", "text")
+
+
+class UnknownProfileFormatError(ValueError):
+    """Profile can only be exported as json or text."""
+
+
+class Profile:
+    """Execution counters filled in by a ``CPU`` constructed with ``profile=``.
+
+    Opcodes and instruction addresses are counted on FETCH, ROM addresses on
+    every microinstruction (FETCH is ROM[0]). Engines that skip the microcode
+    report retired ``(opcode, taken)`` pairs instead; they are expanded to ROM
+    addresses when the profile is read. Ticks per instruction address exclude
+    cache stalls. With a compiler source map, ticks are also summed per source
+    line and per function.
+    """
+
+    def __init__(self, source_map=None):
+        self.source_map = source_map
+        self.opcodes: Counter[int] = Counter()
+        self.ips: Counter[int] = Counter()
+        self.ip_ticks: Counter[int] = Counter()
+        self.micro: Counter[int] = Counter()
+        self.retired: Counter[tuple[int, bool]] = Counter()
+        self.reads: Counter[int] = Counter()
+        self.writes: Counter[int] = Counter()
+
+    def hooks(self, trace_fetch, trace_state):
+        """Wrap the tracer hooks so that the profile sees every FETCH and microinstruction."""
+        opcodes, ips, micro, ip_ticks = self.opcodes, self.ips, self.micro, self.ip_ticks
+        current = [0]
+
+        def fetch(tick, ip, ir):
+            opcodes[(ir >> 27) & 0x1F] += 1
+            ips[ip] += 1
+            micro[0] += 1
+            ip_ticks[ip] += 1
+            current[0] = ip
+            if trace_fetch is not None:
+                trace_fetch(tick, ip, ir)
+
+        def state(r):
+            micro[r.uPC] += 1
+            ip_ticks[current[0]] += 1
+            if trace_state is not None:
+                trace_state(r)
+
+        return fetch, state
+
+    def wrap_handler(self, opcode, handler):
+        retired, ip_ticks = self.retired, self.ip_ticks
+        lengths = MICROPROGRAM_LEN[opcode]
+
+        def profiled(r):
+            ip = r.IP
+            taken = handler(r)
+            retired[opcode, taken] += 1
+            ip_ticks[ip] += lengths[taken]
+            return taken
+
+        return profiled
+
+    def rom_counts(self):
+        counts = Counter(self.micro)
+        for (opcode, taken), n in self.retired.items():
+            for upc in microprogram_path(OPCODE_TO_UADDR[opcode], taken)[0]:
+                counts[upc] += n
+        return counts
+
+    def source_ticks(self):
+        """Ticks per source line and per function (``<main>`` for top-level code) from the source map."""
+        owner = {}
+        for entry in sorted(self.source_map["ranges"], key=lambda e: e["start"] - e["end"]):
+            for ip in range(entry["start"], entry["end"]):
+                owner[ip] = entry
+        lines: Counter[int] = Counter()
+        functions: Counter[str] = Counter()
+        for ip, ticks in self.ip_ticks.items():
+            entry = owner.get(ip)
+            if entry is None:
+                functions["<main>"] += ticks
+                continue
+            lines[entry["line"]] += ticks
+            functions[entry["function"] or "<main>"] += ticks
+        return lines, functions
+
+    def to_dict(self):
+        rom = self.rom_counts()
+        result = {
+            "instructions": sum(self.opcodes.values()),
+            "opcodes": {OPCODE_NAMES.get(op, str(op)): n for op, n in self.opcodes.most_common()},
+            "rom": {str(upc): rom[upc] for upc in range(len(ROM)) if rom[upc]},
+            "ips": {str(ip): n for ip, n in sorted(self.ips.items())},
+            "ip_ticks": {str(ip): n for ip, n in sorted(self.ip_ticks.items())},
+            "reads": {str(addr): n for addr, n in sorted(self.reads.items())},
+            "writes": {str(addr): n for addr, n in sorted(self.writes.items())},
+        }
+        if self.source_map is not None:
+            lines, functions = self.source_ticks()
+            result["lines"] = {str(line): n for line, n in sorted(lines.items())}
+            result["functions"] = dict(functions.most_common())
+        return result
+
+    def report(self, top=20):
+        total = sum(self.opcodes.values()) or 1
+        lines = [f"instructions: {total}", "", "opcode        count   share"]
+        for op, n in self.opcodes.most_common():
+            lines.append(f"{OPCODE_NAMES.get(op, op)!s:<10} {n:>8} {n / total:7.1%}")
+        lines += ["", "uPC     count"]
+        rom = self.rom_counts()
+        lines += [f"{upc:>3} {rom[upc]:>9}" for upc in range(len(ROM)) if rom[upc]]
+        lines += ["", f"hot IP (top {top})", "  IP     count"]
+        lines += [f"{ip:04} {n:>9}" for ip, n in self.ips.most_common(top)]
+        lines += ["", f"data memory (top {top})", "    addr     reads    writes"]
+        hot = (self.reads + self.writes).most_common(top)
+        lines += [f"{addr:>8} {self.reads[addr]:>9} {self.writes[addr]:>9}" for addr, _ in hot]
+        if self.source_map is not None:
+            lines += self.source_report()
+        return "\n".join(lines)
+
+    def source_report(self):
+        by_line, functions = self.source_ticks()
+        total = sum(self.ip_ticks.values()) or 1
+        lines = ["", f"source lines ({self.source_map['source']})", "line      ticks   share"]
+        lines += [f"{line:>4} {n:>10} {n / total:7.1%}" for line, n in sorted(by_line.items())]
+        lines += ["", "function                  ticks   share"]
+        lines += [f"{name:<20} {n:>10} {n / total:7.1%}" for name, n in functions.most_common()]
+        return lines
+
+    def save(self, path, fmt="json"):
+        if fmt not in PROFILE_FORMATS:
+            raise UnknownProfileFormatError(fmt)
+        with open(path, "w", encoding="utf-8") as f:
+            if fmt == "json":
+                json.dump(self.to_dict(), f, indent=2)
+            else:
+                f.write(self.report() + "\n")
+
+
+def load_source_map(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class ProfiledMemory:
+    """Data memory wrapper counting the control unit's reads (``get``) and writes per address."""
+
+    def __init__(self, backing, profile):
+        self.backing = backing
+        self.reads = profile.reads
+        self.writes = profile.writes
+
+    def get(self, addr, default=0):
+        self.reads[addr] += 1
+        return self.backing.get(addr, default)
+
+    def __getitem__(self, addr):
+        return self.backing[addr]
+
+    def __setitem__(self, addr, value):
+        self.writes[addr] += 1
+        self.backing[addr] = value
+
+    def __iter__(self):
+        return iter(self.backing)
+
+    def __len__(self):
+        return len(self.backing)
+
+    def keys(self):
+        return self.backing.keys()
+
+    def items(self):
+        return self.backing.items()
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+SNAPSHOT_MAGIC = b"MCSN\x01"
+HEADER = struct.Struct("<IIII")
+
+
+class InvalidSnapshotError(ValueError):
+    """Snapshot file must start with the MCSN header."""
+
+
+class SnapshotImageMismatchError(ValueError):
+    """Snapshot was taken on a machine loaded with a different program or data image."""
+
+
+def _to_le(arr):
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _from_le(data):
+    arr = array("q", data)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def image_hash(cpu):
+    """Identity of what the delta is taken against: the instruction words and the loaded data image."""
+    digest = hashlib.sha256(_to_le(array("I", cpu.memory.instr)))
+    digest.update(_to_le(cpu.data_memory.image))
+    return digest.hexdigest()
+
+
+class Snapshot:
+    """Full machine state at a tick boundary.
+
+    Data memory is kept as a delta against the loaded image: the static segment
+    length, the changed static cells and the whole stack segment. I/O is kept as
+    the input position and the output produced so far. A hash of the instruction
+    words and the loaded data image is kept too, and ``apply`` refuses a machine
+    loaded with anything else.
+    """
+
+    def __init__(self, meta, addrs, values, stack):
+        self.meta = meta
+        self.addrs = addrs
+        self.values = values
+        self.stack = stack
+
+    @classmethod
+    def capture(cls, cpu):
+        static_len, addrs, values, stack = cpu.data_memory.delta()
+        meta = {
+            "image": image_hash(cpu),
+            "registers": dict(vars(cpu.registers)),
+            "last_uPC": cpu.last_uPC,
+            "fetch_pending": cpu.fetch_pending,
+            "static_len": static_len,
+            "input_consumed": cpu.in_port.consumed,
+            "output": cpu.out_port.snapshot(),
+            "cache": cpu.cache.get_state() if cpu.cache is not None else None,
+        }
+        return cls(meta, addrs, values, stack)
+
+    def apply(self, cpu):
+        meta = self.meta
+        actual = image_hash(cpu)
+        if meta["image"] != actual:
+            raise SnapshotImageMismatchError(meta["image"], actual)
+        for name, value in meta["registers"].items():
+            setattr(cpu.registers, name, value)
+        cpu.last_uPC = meta["last_uPC"]
+        cpu.fetch_pending = meta["fetch_pending"]
+        cpu.data_memory.load_delta(meta["static_len"], self.addrs, self.values, self.stack)
+        cpu.in_port.seek(meta["input_consumed"])
+        cpu.out_port.restore(meta["output"])
+        if cpu.cache is not None and meta["cache"] is not None:
+            cpu.cache.set_state(meta["cache"])
+
+    def save(self, path):
+        meta = json.dumps(self.meta, separators=(",", ":")).encode("utf-8")
+        blobs = [_to_le(self.addrs), _to_le(self.values), _to_le(self.stack)]
+        payload = HEADER.pack(len(meta), *map(len, blobs)) + meta + b"".join(blobs)
+        with open(path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + zlib.compress(payload))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(SNAPSHOT_MAGIC):
+            raise InvalidSnapshotError()
+        payload = zlib.decompress(data[len(SNAPSHOT_MAGIC):])
+        sizes = HEADER.unpack_from(payload)
+        parts = []
+        offset = HEADER.size
+        for size in sizes:
+            parts.append(payload[offset:offset + size])
+            offset += size
+        meta = json.loads(parts[0])
+        return cls(meta, *(_from_le(part) for part in parts[1:]))
@@ -0,0 +1,64 @@
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+
+import async_sim
+import cpu_sim
+import expr_to_asm
+
+SOURCE = os.path.join(os.path.dirname(__file__), "lisp", "hello_user_name", "hello_user_name.lisp")
+
+
+async def typed(text, delay):
+    for ch in text:
+        await asyncio.sleep(delay)
+        yield ch
+
+
+async def never(event):
+    await event.wait()
+    yield "late\n"
+
+
+def test_sessions_share_one_loop():
+    names = [f"user{i}\n" for i in range(200)]
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        target = os.path.join(tmpdirname, "target.bin")
+        expr_to_asm.main(SOURCE, target)
+        instr, data = cpu_sim.load_binary(target)
+        expected = []
+        for i, name in enumerate(names):
+            input_path = os.path.join(tmpdirname, f"input{i}.txt")
+            with open(input_path, "w", encoding="utf-8") as file:
+                file.write(name)
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected.append(cpu_sim.CPU(instr, data, log_path=None, input_path=input_path, trace_level="off"))
+                expected[-1].run()
+
+    async def main():
+        outputs: list[list[int]] = [[] for _ in names]
+        stalled_output: list[int] = []
+        waiting = asyncio.Event()
+
+        async def collect(words, out):
+            out.extend(words)
+
+        def session(chunks, out):
+            cpu = cpu_sim.CPU(instr, data, log_path=None, trace_level="off")
+            return async_sim.run_async(cpu, chunks, lambda words: collect(words, out), slice_ticks=100)
+
+        stalled = asyncio.create_task(session(never(waiting), stalled_output))
+        cpus = await asyncio.gather(*(session(typed(name, 0.001), out) for name, out in zip(names, outputs)))
+        assert not stalled.done()
+        assert stalled_output
+        waiting.set()
+        await stalled
+        return cpus, outputs
+
+    cpus, outputs = asyncio.run(main())
+
+    for cpu, out, reference in zip(cpus, outputs, expected):
+        assert out == reference.output_buffer
+        assert cpu.registers.macro_cnt == reference.registers.macro_cnt
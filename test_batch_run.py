@@ -0,0 +1,71 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+from array import array
+
+import batch_run
+import cpu_sim
+import expr_to_asm
+import pytest
+from data_memory import DataImage
+from instrucrions import OPCODE_TABLE
+
+LISP_DIR = os.path.join(os.path.dirname(__file__), "lisp")
+
+
+def test_batch_matches_single_runs():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        manifest = os.path.join(tmpdirname, "manifest.jsonl")
+        results = os.path.join(tmpdirname, "results.jsonl")
+        jobs = []
+        for name in ("cat", "hello_user_name"):
+            expr_to_asm.main(os.path.join(LISP_DIR, name, f"{name}.lisp"), os.path.join(tmpdirname, f"{name}.bin"))
+            for user in ("Alice", "Bob"):
+                with open(os.path.join(tmpdirname, f"{user}.txt"), "w", encoding="utf-8") as file:
+                    file.write(user + "\n")
+                jobs.append({"program": f"{name}.bin", "input": f"{user}.txt"})
+        with open(os.path.join(tmpdirname, "garbage.bin"), "wb") as file:
+            file.write(b"AC")  # shorter than any header
+        jobs.append({"program": "garbage.bin", "input": "Alice.txt"})
+        jobs.append({"program": "missing.bin", "input": "Alice.txt"})
+        with open(manifest, "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(job) + "\n" for job in jobs)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            failed = batch_run.main(manifest, results, workers=2)
+            expected = [cpu_sim.main(os.path.join(tmpdirname, job["program"]), os.path.join(tmpdirname, job["input"]),
+                                     log_path=None, mode="fast") for job in jobs[:-2]]
+        with open(results, encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file]
+
+    assert failed == 2
+    assert rows[-2]["status"].startswith("error: ")
+    assert rows[-1]["status"].startswith("error: FileNotFoundError")
+    assert [row["status"] for row in rows[:-2]] == ["ok"] * 4
+    assert [(row["ticks"], row["output"]) for row in rows[:-2]] == [
+        (cpu.registers.macro_cnt, cpu.output_buffer) for cpu in expected
+    ]
+
+
+def test_worker_failure_stays_with_its_job(monkeypatch):
+    def broken_engine(*args, **kwargs):
+        raise ZeroDivisionError
+
+    monkeypatch.setattr(cpu_sim, "engine_class", lambda mode: broken_engine)
+    monkeypatch.setitem(batch_run._images, "broken.bin", (array("I"), DataImage([])))
+    result = batch_run.run_job(("broken.bin", None))
+
+    assert result["status"] == "error: ZeroDivisionError: "
+    assert result["output"] is None
+
+
+@pytest.mark.parametrize("mode", ["mc", "fast", "block"])
+def test_program_that_never_halts_times_out(monkeypatch, mode):
+    loop = array("I", [OPCODE_TABLE["jmp"] << 27])  # jmp 0
+    monkeypatch.setitem(batch_run._images, "loop.bin", (loop, DataImage([])))
+    result = batch_run.run_job(("loop.bin", None), mode, max_ticks=1000)
+
+    assert result["status"] == "timeout"
+    assert 1000 <= result["ticks"] < 1100
@@ -0,0 +1,26 @@
+import tempfile
+
+import bench
+
+
+def test_bench_reports_every_trace_level():
+    source = bench.SYNTHETIC["loop"].format(size=20)
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        rows = list(bench.bench_workload("loop_20", source, tmpdirname, ["mc", "fast"], repeat=1))
+
+    assert [(row["engine"], row["trace_level"]) for row in rows] == [
+        ("mc", "off"), ("mc", "macro"), ("mc", "full"), ("fast", "off"), ("fast", "macro"),
+    ]
+    assert len({(row["ticks"], row["instructions"]) for row in rows}) == 1
+    assert all(0 < row["instructions"] < row["ticks"] and row["peak_rss_kb"] > 0 for row in rows)
+
+
+def test_regression_check_uses_threshold():
+    def report(ticks_per_s):
+        row = {"workload": "loop_20", "engine": "fast", "trace_level": "off",
+               "ticks_per_s": ticks_per_s, "instructions_per_s": ticks_per_s / 5}
+        return {"results": [row]}
+
+    assert bench.check_regressions(report(1000), report(850), threshold=0.2) == []
+    assert len(bench.check_regressions(report(1000), report(700), threshold=0.2)) == 2
+    assert bench.check_regressions(report(1000), {"results": []}, threshold=0.2) == []
@@ -0,0 +1,48 @@
+import os
+import struct
+import tempfile
+
+import binary_image
+import cpu_sim
+import pytest
+from data_memory import DataMemory
+
+
+def test_image_round_trips_with_gaps():
+    words = [0x78000001, 0x10000003, 0xFFFFFFFF]
+    data = {0: 5, 1: -1, 2: 0x7FFFFFFF, 10: -(1 << 31), 11: 7}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "image.bin")
+        with open(path, "wb") as f:
+            binary_image.write_image(f, words, data)
+        instr, image = cpu_sim.load_binary(path)
+
+    assert list(instr) == words
+    assert [(base, list(run)) for base, run in image.runs] == [(0, [5, -1, 0x7FFFFFFF]), (10, [-(1 << 31), 7])]
+    memory = DataMemory(image)
+    assert dict(memory.items()) == {**data, **dict.fromkeys(range(3, 10), 0)}
+
+
+def test_v1_binary_still_loads():
+    words = [0x78000001, 0x00000000]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "old.bin")
+        with open(path, "wb") as f:
+            f.write(struct.pack(">3I", len(words), *words))
+            f.write(struct.pack(">IiIi", 4, -3, 5, 9))
+        instr, image = cpu_sim.load_binary(path)
+
+    assert list(instr) == words
+    assert dict(image.items()) == {4: -3, 5: 9}
+
+
+@pytest.mark.parametrize("cut", [0, 2, 10, 17, 26, 30])
+def test_truncated_binary_is_a_format_error(cut):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "image.bin")
+        with open(path, "wb") as f:
+            binary_image.write_image(f, [0x78000001], {0: 5})
+        with open(path, "r+b") as f:
+            f.truncate(cut)
+        with pytest.raises(binary_image.TruncatedBinaryError):
+            cpu_sim.load_binary(path)
@@ -0,0 +1,44 @@
+import contextlib
+import io
+import os
+import tempfile
+
+from block_sim import BlockCPU
+from cpu_sim import CPU
+from instrucrions import OPCODE_TABLE
+
+
+def encode(name, arg=0):
+    return (OPCODE_TABLE[name] << 27) | (arg & 0x07FFFFFF)
+
+
+def test_text_write_invalidates_translated_block():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        trace_path = os.path.join(tmpdirname, "trace.log")
+        instr = [encode("load", 0), encode("out"), encode("halt")]
+        cpu = BlockCPU(instr, {0: 7, 1: 9}, log_path=trace_path)
+        block = cpu.lookup(0)
+        cpu.memory.instr[0] = encode("load", 1)
+
+        assert block.stale
+        assert 0 not in cpu.blocks
+        with contextlib.redirect_stdout(io.StringIO()):
+            cpu.run()
+
+    assert cpu.output_buffer == [9]
+
+
+def test_undefined_opcode_mid_block_matches_microcoded_run():
+    # an opcode without a microprogram starts at uPC 0: IP <- 0, then LOAD of its argument, IP <- 1
+    instr = [encode("jmp", 3), encode("out"), encode("halt"),
+             encode("load", 0), encode("add", 1), encode("push"), (0x1A << 27) | 1]
+    cpus = [engine(list(instr), {0: 5, 1: 7}, log_path=None, trace_level="off") for engine in (CPU, BlockCPU)]
+    for cpu in cpus:
+        cpu.out_port.echo = False
+        cpu.run()
+
+    mc, block = (cpu.registers for cpu in cpus)
+    assert (block.macro_cnt, block.ACC, block.SP, block.IP, block.Z, block.N) == (
+        mc.macro_cnt, mc.ACC, mc.SP, mc.IP, mc.Z, mc.N)
+    assert cpus[1].data_memory[mc.SP] == cpus[0].data_memory[mc.SP] == 12
+    assert cpus[1].output_buffer == cpus[0].output_buffer == [7]
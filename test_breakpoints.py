@@ -0,0 +1,80 @@
+import contextlib
+import io
+import os
+import tempfile
+
+from cpu_sim import CPU
+from instrucrions import OPCODE_TABLE
+from microcode_memory import OPCODE_TO_UADDR
+
+PROGRAM = [("load", 0), ("add", 1), ("store", 2), ("out", 0), ("halt", 0)]
+
+
+def encode(name, arg=0):
+    return (OPCODE_TABLE[name] << 27) | (arg & 0x07FFFFFF)
+
+
+def make_cpu(output_path=None):
+    cpu = CPU([encode(name, arg) for name, arg in PROGRAM], {0: 5, 1: 7}, log_path=None, output_path=output_path,
+              trace_level="off")
+    cpu.out_port.echo = False
+    return cpu
+
+
+def run_to_end(cpu):
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert cpu.run_until()
+    assert cpu.stop_reason == ("halted", None)
+    assert cpu.output_buffer == [12]
+
+
+def test_breakpoints_stop_and_resume():
+    cpu = make_cpu()
+    cpu.breakpoints.ip.add(2)
+    cpu.breakpoints.upc.add(OPCODE_TO_UADDR[OPCODE_TABLE["out"]])
+
+    assert not cpu.run_until()
+    assert cpu.stop_reason == ("ip", 2)
+    assert cpu.fetch_pending
+    assert not cpu.run_until()
+    assert cpu.stop_reason == ("upc", OPCODE_TO_UADDR[OPCODE_TABLE["out"]])
+    assert cpu.registers.IP == 3
+    run_to_end(cpu)
+
+
+def test_watchpoint_and_condition():
+    cpu = make_cpu()
+    cpu.breakpoints.watch.add(2)
+
+    def acc_is_twelve(r):
+        return r.ACC == 12
+
+    cpu.breakpoints.conditions.append(acc_is_twelve)
+
+    assert not cpu.run_until()
+    assert cpu.stop_reason == ("condition", acc_is_twelve)
+    assert cpu.registers.IP == 1
+    assert not cpu.run_until()
+    assert cpu.stop_reason == ("watch", 2)
+    assert cpu.data_memory[2] == 12
+    run_to_end(cpu)
+
+
+def test_run_until_tick_without_breakpoints():
+    cpu = make_cpu()
+
+    assert not cpu.run_until(tick=3)
+    assert cpu.stop_reason == ("tick", 3)
+    run_to_end(cpu)
+
+
+def test_run_until_finishes_a_halted_machine():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        path = os.path.join(tmpdirname, "output.txt")
+        cpu = make_cpu(path)
+        run_to_end(cpu)
+        with open(path, encoding="utf-8") as file:
+            assert file.read() == "[12]"
+        cpu.finish()  # a second finish leaves the file alone
+        with open(path, encoding="utf-8") as file:
+            assert file.read() == "[12]"
@@ -0,0 +1,64 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+
+import build
+import cpu_sim
+import expr_to_asm
+import linker
+import pytest
+
+LIB = """(defunc digit (c) (
+  (print_string c)
+))
+(defunc show (n) (
+  (print_string "n=")
+  (funcall digit ((+ n 48)))
+))
+"""
+MAIN = """(var x 7)
+(funcall show (x))
+(print_string "!")
+"""
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def run(target, tmpdir):
+    output = os.path.join(tmpdir, "out.txt")
+    with contextlib.redirect_stdout(io.StringIO()):
+        cpu_sim.main(target, output_path=output, log_path=None, mode="fast")
+    with open(output, encoding="utf-8") as f:
+        return "".join(map(chr, json.loads(f.read())))
+
+
+def test_linked_units_run_like_one_source():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        lib, main, whole = (os.path.join(tmpdir, name) for name in ("lib.lisp", "main.lisp", "whole.lisp"))
+        write(lib, LIB)
+        write(main, MAIN)
+        write(whole, LIB + MAIN)
+        target = os.path.join(tmpdir, "linked.bin")
+        cache = os.path.join(tmpdir, "cache")
+
+        assert build.build([main, lib], target, cache) == [main, lib]
+        expr_to_asm.main(whole, os.path.join(tmpdir, "whole.bin"))
+        assert run(target, tmpdir) == run(os.path.join(tmpdir, "whole.bin"), tmpdir) == "n=7!"
+
+        assert build.build([main, lib], target, cache) == []
+        write(main, MAIN.replace("7", "5"))
+        assert build.build([main, lib], target, cache) == [main]
+        assert run(target, tmpdir) == "n=5!"
+
+
+def test_missing_function_is_reported_at_link_time():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        main = os.path.join(tmpdir, "main.lisp")
+        write(main, MAIN)
+        with pytest.raises(linker.UndefinedSymbolError):
+            linker.link([expr_to_asm.compile_file(main)])
@@ -0,0 +1,30 @@
+from cache import Cache
+
+
+def test_direct_mapped_conflict_and_writeback():
+    cache = Cache(sets=2, ways=1, line_size=2)
+
+    assert cache.read(0) == 10
+    assert cache.read(1) == 1
+    assert cache.write(1) == 1
+    assert cache.read(4) == 20
+    assert cache.stats["evictions"] == 1
+    assert cache.stats["writebacks"] == 1
+
+
+def test_lru_keeps_recently_used_line():
+    cache = Cache(sets=1, ways=2, line_size=1, policy="lru")
+    for addr in (0, 1, 0, 2):
+        cache.read(addr)
+
+    assert cache.read(0) == 1
+    assert cache.read(1) == 10
+
+
+def test_write_through_does_not_allocate():
+    cache = Cache(sets=1, ways=1, line_size=1, write_policy="through")
+
+    assert cache.write(0) == 10
+    assert cache.read(0) == 10
+    assert cache.write(0) == 10
+    assert cache.stats["writebacks"] == 0
@@ -0,0 +1,57 @@
+from constant_fold import fold_program
+from tokenizer import LispParser, ast_to_expr
+
+
+def fold(source):
+    return fold_program([ast_to_expr(e) for e in LispParser(source).parse_program()])
+
+
+def values(node):
+    return node["expr"]["value"] if node["expr"]["type"] == "number" else None
+
+
+def test_arithmetic_wraps_like_the_alu_and_propagates():
+    ast = fold("""(var a 2147483647)
+(var b (+ a 1))
+(var c (* (- 0 3) 7))
+(var d (/ 7 2))
+(var e (/ c 2))
+(var f (/ 1 0))""")
+
+    assert [values(node) for node in ast] == [2147483647, -2147483648, -21, 3, None, 0]
+
+
+def test_loops_and_calls_forget_assigned_variables():
+    ast = fold("""(defunc g (x) ((set x 1)))
+(var i 0)
+(var n 4)
+(var tmp 0)
+(while (< i n) (
+  (set i (+ i 1))
+))
+(set tmp (+ n i))
+(funcall g (n))
+(set tmp (+ n 1))""")
+
+    loop = ast[4]
+    assert loop["cond"]["left"] == {"type": "var", "name": "i"}
+    assert loop["cond"]["right"] == {"type": "number", "value": 4}
+    assert ast[5]["expr"]["left"] == {"type": "number", "value": 4}
+    assert ast[5]["expr"]["right"]["type"] == "var"
+    assert ast[6]["args"] == [{"type": "number", "value": 4}]
+    assert values(ast[7]) is None
+
+
+def test_constant_conditions_keep_only_the_branch_that_runs():
+    ast = fold("""(var a 3)
+(var b 0)
+(if (= a 3) (set b 1) (set b 2))
+(if (= a 4) (0) (set b 5))
+(while (= b 5) ((set a 1)))""")
+
+    # a taken jz skips then and the second jz, tested on ACC = IP, falls into else
+    assert ast[2]["type"] == "seq"
+    assert values(ast[2]["body"][1]) == 2
+    assert ast[3]["body"][0] == {"type": "number", "value": -1}
+    assert values(ast[3]["body"][1]) == 5
+    assert [node["type"] for node in ast[4]["body"]] == ["number"]
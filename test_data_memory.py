@@ -0,0 +1,24 @@
+import pytest
+from data_memory import STACK_TOP, DataMemory, UnmappedAddressError
+
+
+def test_segments_grow_on_write():
+    mem = DataMemory({0: 5, 3: -1})
+    mem[STACK_TOP - 2] = 0xFFFFFFFF
+
+    assert len(mem.static) == 4
+    assert len(mem.stack) == 3
+    assert mem.get(3) == -1
+    assert mem.get(STACK_TOP - 2) == 0xFFFFFFFF
+    assert mem.get(STACK_TOP) == 0
+
+
+def test_unmapped_reads_zero_and_writes_fail():
+    mem = DataMemory(static_limit=8, stack_limit=8)
+
+    assert mem.get(100) == 0
+    assert mem.get(-1) == 0
+    with pytest.raises(UnmappedAddressError):
+        mem[8] = 1
+    with pytest.raises(UnmappedAddressError):
+        mem[STACK_TOP + 1] = 1
@@ -0,0 +1,150 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import cpu_sim
+import expr_to_asm
+import pytest
+from instrucrions import OPCODE_TABLE
+from profiler import Profile
+from tokenizer import LispParser, ast_to_expr
+
+
+def test_peephole_keeps_jump_targets_and_fixes_offsets():
+    ctx = expr_to_asm.CompileContext()
+    main, head, done = ctx.new_label(), ctx.new_label(), ctx.new_label()
+    ctx.emit("jmp", main)
+    ctx.place(main)
+    for instr in [("load", 1), ("push",), ("load", 2), ("store", 9), ("pop",), ("add", 9), ("store", 3)]:
+        ctx.emit(*instr)  # leaf binop
+    ctx.place(head)  # load 3 is the loop head, so it stays
+    ctx.emit("load", 3)
+    ctx.emit("jz", done)
+    ctx.emit("store", 4)
+    ctx.emit("load", 4)
+    ctx.emit("jmp", head)
+    ctx.place(done)
+    ctx.emit("halt")
+
+    expr_to_asm.peephole(ctx)
+    expr_to_asm.resolve_labels(ctx)
+
+    assert ctx.code == [
+        ("jmp", 1),
+        ("load", 1), ("add", 2),
+        ("store", 3), ("load", 3),
+        ("jz", 3),
+        ("store", 4),
+        ("jmp", -3),
+        ("halt",),
+    ]
+
+
+def test_while_jumps_back_to_its_condition():
+    source = "(var i 0)\n(while (< i 3) ((set i (+ i 1))))"
+    ctx = expr_to_asm.compile_unit([ast_to_expr(e) for e in LispParser(source).parse_program()])
+
+    back = len(ctx.code) - 1
+    assert ctx.code[back][0] == "jmp"
+    # the store of (var i 0) right before the loop must not run again on every iteration
+    assert ctx.code[back + ctx.code[back][1]] == ("load", ctx.var_map["i"])
+    assert ctx.code[back + ctx.code[back][1] - 1] == ("store", ctx.var_map["i"])
+
+
+def binop_temps(ctx):
+    return [op[1] for op, after in zip(ctx.code, ctx.code[1:]) if op[0] == "store" and after == ("pop",)]
+
+
+def test_binop_temps_are_reused():
+    source = """(defunc f (p) ((+ p (* p p))))
+(defunc g (q) ((* q (- q 1))))
+(var a 1)
+(var b 2)
+(var x (+ a (* b b)))
+(var y (- a (+ b a)))
+"""
+    ctx = expr_to_asm.compile_unit([ast_to_expr(e) for e in LispParser(source).parse_program()])
+
+    temps = binop_temps(ctx)
+    # one in each function, then one for each top-level binop: all the same slot
+    assert len(temps) == 4
+    assert len(set(temps)) == 1
+
+
+def test_temp_reused_across_a_nested_call_keeps_the_result():
+    source = """(defunc f (p) ((+ p (* p 1))))
+(defunc g (q) ((+ q (funcall f ((+ q (* q 1)))))))
+(var r (funcall g (3)))
+(print_string r)
+"""
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        source_path = os.path.join(tmpdirname, "nested.lisp")
+        target = os.path.join(tmpdirname, "nested.bin")
+        with open(source_path, "w", encoding="utf-8") as file:
+            file.write(source)
+        expr_to_asm.main(source_path, target)
+        assert len(set(binop_temps(expr_to_asm.compile_unit(
+            [ast_to_expr(e) for e in LispParser(source).parse_program()])))) == 1
+        with contextlib.redirect_stdout(io.StringIO()):
+            cpu = cpu_sim.main(target, log_path=os.path.join(tmpdirname, "trace.log"), mode="fast")
+
+    # g(3) = 3 + f(6) = 3 + 12: f's outer + writes the slot g's outer + uses, but before g stores into it
+    assert cpu.output_buffer == [15]
+
+
+def test_tail_calls_run_in_constant_stack():
+    source = """(defunc countdown (i) (
+    (set i (- i 1))
+    (if (= i 0) (0) (funcall countdown (i)))
+))
+(funcall countdown (3000))
+"""
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        source_path = os.path.join(tmpdirname, "countdown.lisp")
+        target = os.path.join(tmpdirname, "countdown.bin")
+        with open(source_path, "w", encoding="utf-8") as file:
+            file.write(source)
+        expr_to_asm.main(source_path, target)
+        profile = Profile()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cpu = cpu_sim.main(target, log_path=os.path.join(tmpdirname, "trace.log"), mode="fast", profile=profile)
+
+    assert cpu.registers.SP == 0x7FFFFFFC
+    # only the call from the top level pushes a return address
+    assert [addr for addr in profile.writes if addr >= cpu.registers.SP - 0x10000] == [0x7FFFFFFB]
+    assert profile.opcodes[OPCODE_TABLE["call"]] == 1
+
+
+def test_small_constants_are_immediates():
+    ctx = expr_to_asm.CompileContext()
+    x = ctx.define_var("x")
+    expr = {"type": "binop", "op": "/", "left": {"type": "binop", "op": "*", "left": {
+        "type": "binop", "op": "+", "left": {"type": "var", "name": "x"}, "right": {"type": "number", "value": 5},
+    }, "right": {"type": "number", "value": 1 << 26}}, "right": {"type": "number", "value": -2}}
+    expr_to_asm.compile_expr(expr, ctx)
+
+    assert ctx.code[:4] == [("load", x), ("add_imm", 5), ("push",), ("load", ctx.literal_rev[1 << 26])]
+    # a negative divisor goes through tmp, where div sees it unsigned as before
+    tmp = ctx.code[-3][1]
+    assert ctx.code[-4:] == [("load_imm", -2), ("store", tmp), ("pop",), ("div", tmp)]
+    assert list(ctx.literal_rev) == [1 << 26]
+
+
+def test_nesting_beyond_the_recursion_limit_is_a_compile_error():
+    def source(depth):
+        return "(var x " + "(+ " * depth + "1" + " 1)" * depth + ")\n"
+
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        path = os.path.join(tmpdirname, "deep.lisp")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(source(100))
+        assert expr_to_asm.compile_file(path)["text"]
+
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(source(10 * sys.getrecursionlimit()))
+        with pytest.raises(expr_to_asm.NestingTooDeepError) as error:
+            expr_to_asm.compile_file(path)
+
+    assert error.value.args == (path, sys.getrecursionlimit())
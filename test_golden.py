@@ -7,6 +7,8 @@ import tempfile
 import cpu_sim
 import expr_to_asm
 import pytest
+import tracer
+from cache import Cache
 
 MAX_LOGS = 150000
 
@@ -51,3 +53,65 @@ def test_translator_asm_and_machine(golden, caplog):
         assert stdout.getvalue().strip() == golden.out["out_stdout"].strip()
         assert output_str.strip() == golden.out["out_output_file"].strip()
         assert trace_log[:MAX_LOGS].strip() == golden.out["out_log"][:MAX_LOGS].strip()
+
+
+def machine_state(cpu):
+    r = cpu.registers
+    return {
+        "registers": dict(vars(r)),
+        "last_uPC": cpu.last_uPC,
+        "data": dict(cpu.memory.data),
+        "output": cpu.output_buffer,
+    }
+
+
+@pytest.mark.golden_test("tests/*.yml")
+@pytest.mark.parametrize("mode", ["fast", "block"])
+@pytest.mark.parametrize("cache_config", [None, {"sets": 4, "ways": 2, "line_size": 2, "policy": "fifo"}])
+def test_engine_matches_microcode(golden, mode, cache_config):
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        source = os.path.join(tmpdirname, "source.lisp")
+        input_stream = os.path.join(tmpdirname, "input.txt")
+        target = os.path.join(tmpdirname, "target.bin")
+        trace_path = os.path.join(tmpdirname, "trace.log")
+
+        with open(source, "w", encoding="utf-8") as file:
+            file.write(golden.get("in_source"))
+        with open(input_stream, "w", encoding="utf-8") as file:
+            file.write(golden["in_stdin"])
+
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            expr_to_asm.main(source, target)
+            caches = [Cache(**cache_config) if cache_config else None for _ in range(2)]
+            expected = machine_state(cpu_sim.main(target, input_stream, log_path=trace_path, cache=caches[0]))
+            expected_stdout = stdout.getvalue()
+            actual = machine_state(cpu_sim.main(target, input_stream, log_path=trace_path, mode=mode,
+                                                cache=caches[1]))
+
+        assert actual == expected
+        assert stdout.getvalue() == expected_stdout * 2
+
+
+@pytest.mark.golden_test("tests/*.yml")
+def test_binary_trace_decodes_to_text_log(golden):
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        source = os.path.join(tmpdirname, "source.lisp")
+        input_stream = os.path.join(tmpdirname, "input.txt")
+        target = os.path.join(tmpdirname, "target.bin")
+        trace_bin = os.path.join(tmpdirname, "trace.bin")
+        trace_path = os.path.join(tmpdirname, "trace.log")
+
+        with open(source, "w", encoding="utf-8") as file:
+            file.write(golden.get("in_source"))
+        with open(input_stream, "w", encoding="utf-8") as file:
+            file.write(golden["in_stdin"])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            expr_to_asm.main(source, target)
+            cpu_sim.main(target, input_stream, log_path=trace_bin, trace_format="binary")
+        tracer.decode_file(trace_bin, trace_path)
+
+        with open(trace_path, encoding="utf-8") as file:
+            trace_log = file.read()
+
+        assert trace_log[:MAX_LOGS].strip() == golden.out["out_log"][:MAX_LOGS].strip()
@@ -0,0 +1,47 @@
+import contextlib
+import io
+import os
+import tempfile
+
+from ports import InputPort, OutputPort
+
+
+def test_input_port_reads_in_chunks_until_eof():
+    port = InputPort(stream=io.StringIO("abc\n"), chunk_size=2)
+
+    assert [port.read() for _ in range(5)] == [97, 98, 99, 10, None]
+    assert port.consumed == 4
+
+
+def test_output_port_streams_list_format():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        path = os.path.join(tmpdirname, "output.txt")
+        port = OutputPort(path)
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            for value in (72, 105):
+                port.write(value)
+        port.close()
+        empty = OutputPort(os.path.join(tmpdirname, "empty.txt"))
+        empty.close()
+
+        with open(path, encoding="utf-8") as file:
+            assert file.read() == str([72, 105])
+        with open(os.path.join(tmpdirname, "empty.txt"), encoding="utf-8") as file:
+            assert file.read() == "[]"
+    assert stdout.getvalue() == "[OUT]: 72\n[OUT]: 105\n"
+    assert port.values is None
+
+
+def test_output_port_reads_back_words_from_file():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        port = OutputPort(os.path.join(tmpdirname, "output.txt"), echo=False)
+        assert port.words() == []
+        for value in (72, 105):
+            port.write(value)
+        assert port.words() == [72, 105]
+        port.write(-3)
+        assert port.words() == [72, 105, -3]
+        port.close()
+        assert port.words() == [72, 105, -3]
+        port.restore({"count": 1, "text": "[72", "values": None})
+        assert port.words() == [72]
@@ -0,0 +1,68 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+
+import cpu_sim
+import expr_to_asm
+import pytest
+from instrucrions import OPCODE_TABLE
+from microcode_memory import MICROPROGRAM_LEN
+from profiler import Profile, load_source_map
+from test_golden import machine_state
+
+SOURCE = os.path.join(os.path.dirname(__file__), "lisp", "hello_user_name", "hello_user_name.lisp")
+
+
+def run_profiled(target, input_stream, trace_path, mode):
+    profile = Profile()
+    with contextlib.redirect_stdout(io.StringIO()):
+        cpu = cpu_sim.main(target, input_stream, log_path=trace_path, mode=mode, profile=profile)
+    return cpu, profile
+
+
+@pytest.mark.parametrize("mode", ["fast", "block"])
+def test_profile_matches_microcode(mode):
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        target = os.path.join(tmpdirname, "target.bin")
+        input_stream = os.path.join(tmpdirname, "input.txt")
+        trace_path = os.path.join(tmpdirname, "trace.log")
+        profile_path = os.path.join(tmpdirname, "profile.json")
+        with open(input_stream, "w", encoding="utf-8") as file:
+            file.write("Alice\n")
+        expr_to_asm.main(SOURCE, target)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            plain = machine_state(cpu_sim.main(target, input_stream, log_path=trace_path))
+        cpu, expected = run_profiled(target, input_stream, trace_path, "mc")
+        _, actual = run_profiled(target, input_stream, trace_path, mode)
+        actual.save(profile_path)
+        with open(profile_path, encoding="utf-8") as file:
+            exported = json.load(file)
+
+    assert machine_state(cpu) == plain
+    assert sum(expected.rom_counts().values()) == cpu.registers.macro_cnt
+    assert actual.to_dict() == expected.to_dict() == exported
+    assert exported["opcodes"]["in"] == len("Alice\n")
+    assert "hot IP" in actual.report()
+
+
+def test_ticks_are_attributed_to_source_lines_and_functions():
+    source = os.path.join(os.path.dirname(__file__), "lisp", "tail_recursion", "tail_recursion.lisp")
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        target = os.path.join(tmpdirname, "target.bin")
+        trace_path = os.path.join(tmpdirname, "trace.log")
+        expr_to_asm.main(source, target)
+        profile = Profile(load_source_map(target + ".map"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            cpu = cpu_sim.main(target, log_path=trace_path, mode="fast", profile=profile)
+
+    lines, functions = profile.source_ticks()
+    assert sum(functions.values()) == cpu.registers.macro_cnt
+    assert set(functions) == {"<main>", "tail_recursion_loop"}
+    assert functions["tail_recursion_loop"] > functions["<main>"]
+    # ret belongs to the defunc form on line 1; (print_string char) is a single out once the
+    # peephole pass drops the reload of char, and it runs once per call
+    assert lines[4] == 9 * (MICROPROGRAM_LEN[OPCODE_TABLE["out"]][0] + 1)
+    assert set(lines) == {1, 2, 3, 4, 5, 6, 8}
@@ -0,0 +1,60 @@
+import contextlib
+import io
+import os
+import tempfile
+
+import cpu_sim
+import expr_to_asm
+import pytest
+from cache import Cache
+from instrucrions import OPCODE_TABLE
+from snapshot import Snapshot, SnapshotImageMismatchError
+from test_golden import machine_state
+
+SOURCE = os.path.join(os.path.dirname(__file__), "lisp", "hello_user_name", "hello_user_name.lisp")
+
+
+@pytest.mark.parametrize("mode", ["mc", "fast", "block"])
+@pytest.mark.parametrize("tick", [1, 2, 700, 1001])
+def test_resume_from_saved_snapshot(mode, tick):
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        target = os.path.join(tmpdirname, "target.bin")
+        input_stream = os.path.join(tmpdirname, "input.txt")
+        snap_path = os.path.join(tmpdirname, "state.snap")
+        trace_path = os.path.join(tmpdirname, "trace.log")
+        outputs = [os.path.join(tmpdirname, f"output{i}.txt") for i in range(3)]
+        with open(input_stream, "w", encoding="utf-8") as file:
+            file.write("Alice\n")
+
+        def make(engine, output):
+            instr, data = cpu_sim.load_binary(target)
+            return cpu_sim.engine_class(engine)(instr, data, log_path=trace_path, input_path=input_stream,
+                                                output_path=output, cache=Cache(sets=2, ways=2))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            expr_to_asm.main(SOURCE, target)
+            reference = make("mc", outputs[0])
+            reference.run()
+
+            warm = make("mc", outputs[1])
+            assert not warm.run_until(tick)
+            warm.snapshot().save(snap_path)
+
+            resumed = make(mode, outputs[2])
+            resumed.restore(Snapshot.load(snap_path))
+            resumed.run()
+
+        assert machine_state(resumed) == machine_state(reference)
+        assert resumed.cache.stats == reference.cache.stats
+        with open(outputs[0], encoding="utf-8") as want, open(outputs[2], encoding="utf-8") as got:
+            assert got.read() == want.read()
+
+
+def test_restore_into_other_program_is_refused():
+    instr = [OPCODE_TABLE["halt"] << 27]
+    taken = cpu_sim.CPU(instr, {0: 1}, log_path=os.devnull).snapshot()
+    with pytest.raises(SnapshotImageMismatchError):
+        cpu_sim.CPU(instr, {0: 2}, log_path=os.devnull).restore(taken)
+    with pytest.raises(SnapshotImageMismatchError):
+        cpu_sim.CPU(instr + instr, {0: 1}, log_path=os.devnull).restore(taken)
+    cpu_sim.CPU(instr, {0: 1}, log_path=os.devnull).restore(taken)
@@ -0,0 +1,37 @@
+import pytest
+from tokenizer import LispParser, UnbalancedParenthesesError, UnterminatedStringError, tokenize_with_positions
+
+
+def test_lexer_tracks_positions_across_comments_and_multiline_strings():
+    source = '(print_string "a;b") ; comment (\n(var s "two\nlines")\n'
+
+    assert tokenize_with_positions(source) == [
+        ("(", 1, 1), ("print_string", 1, 2), ('"a;b"', 1, 15), (")", 1, 20),
+        ("(", 2, 1), ("var", 2, 2), ("s", 2, 6), ('"two\nlines"', 2, 8), (")", 3, 7),
+    ]
+
+
+def test_parser_yields_forms_lazily_and_without_recursion():
+    depth = 20000
+    read = []
+
+    def lines():
+        for line in ["(" * depth + "x" + ")" * depth + "\n", "(print_string x)\n", "(oops\n"]:
+            read.append(line)
+            yield line
+
+    forms = LispParser(lines()).forms()
+    first = next(forms)
+    assert len(read) == 1
+    for _ in range(depth - 1):
+        first = first[0]
+    assert first == ["x"]
+    assert first.span == (1, depth, 1, depth + 2)
+    assert next(forms) == ["print_string", "x"]
+    with pytest.raises(UnbalancedParenthesesError):
+        next(forms)
+
+
+def test_unterminated_string_is_reported():
+    with pytest.raises(UnterminatedStringError):
+        LispParser('(print_string "abc)\n').parse_program()
@@ -0,0 +1,65 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import batch_run
+import cpu_sim
+import expr_to_asm
+import pytest
+from instrucrions import OPCODE_TABLE
+from vector_sim import VectorCPU
+
+LISP_DIR = os.path.join(os.path.dirname(__file__), "lisp")
+USERS = ("Alice\n", "Bob\n", "", "a much longer user name\n")
+
+
+@pytest.mark.parametrize("name", ["hello_user_name", "euler_prob"])
+def test_lockstep_matches_separate_runs(name):
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        target = os.path.join(tmpdirname, "target.bin")
+        expr_to_asm.main(os.path.join(LISP_DIR, name, f"{name}.lisp"), target)
+        inputs = []
+        for i, text in enumerate(USERS):
+            inputs.append(os.path.join(tmpdirname, f"input{i}.txt"))
+            with open(inputs[-1], "w", encoding="utf-8") as file:
+                file.write(text)
+        inputs.append(os.path.join(tmpdirname, "missing.txt"))
+
+        instr, data = cpu_sim.load_binary(target)
+        vector = VectorCPU(instr, data, inputs)
+        vector.run()
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = [cpu_sim.main(target, path, log_path=None, mode="mc", trace_level="off") for path in inputs[:-1]]
+        results = list(batch_run.run_batch([(target, path) for path in inputs], mode="vector"))
+
+    r = vector.registers
+    for row, cpu in enumerate(expected):
+        state = cpu.registers
+        assert (r.macro_cnt[row], r.ACC[row], r.IP[row], r.SP[row]) == (state.macro_cnt, state.ACC, state.IP, state.SP)
+        assert vector.output_buffers[row] == cpu.output_buffer
+        assert list(vector.memory.static[row][:len(cpu.data_memory.static)]) == list(cpu.data_memory.static)
+    assert list(vector.errors) == [len(inputs) - 1]
+    assert [(row["ticks"], row["output"]) for row in results[:-1]] == [
+        (cpu.registers.macro_cnt, cpu.output_buffer) for cpu in expected
+    ]
+    assert results[-1]["status"].startswith("error: FileNotFoundError")
+
+
+def test_vector_mode_without_numpy_says_how_to_install_it(monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        results = os.path.join(tmpdirname, "results.jsonl")
+        with pytest.raises(batch_run.MissingNumpyError, match="--extras vector"):
+            batch_run.main(os.path.join(tmpdirname, "manifest.jsonl"), results, mode="vector")
+        assert not Path(results).exists()
+
+
+def test_rows_past_the_tick_limit_are_timed_out():
+    vector = VectorCPU([OPCODE_TABLE["jmp"] << 27], {}, [None, None])  # jmp 0
+    vector.run(1000)
+
+    assert list(vector.timed_out) == [True, True]
+    assert all(1000 <= ticks < 1010 for ticks in vector.registers.macro_cnt)
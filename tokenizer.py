@@ -1,60 +1,123 @@
+import io
 import re
 
 
 class InvalidWhileBodyError(TypeError):
     """Body of a 'while' expression must be a list."""
 
+
+class UnterminatedStringError(ValueError):
+    """String literal is not closed before the end of the source."""
+
+
+class UnbalancedParenthesesError(ValueError):
+    """Every '(' needs a matching ')'."""
+
+
+# a whole string, a paren, a comment start, an opening quote whose string goes on past this line, an atom
+TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[()]|;|"|[^\s();"]+')
+STRING_TAIL_RE = re.compile(r'(?:[^"\\]|\\.)*"')
+
+
+def lex(lines):
+    """Yield ``(token, line, col)`` from an iterable of source lines, both counted from 1.
+
+    Lines are read one at a time; a string literal may span several of them.
+    """
+    pending, start = None, (0, 0)
+    for line_no, text in enumerate(lines, 1):
+        pos = 0
+        if pending is not None:
+            match = STRING_TAIL_RE.match(text)
+            if match is None:
+                pending += text
+                continue
+            yield pending + match.group(), *start
+            pending = None
+            pos = match.end()
+        for token, col in line_tokens(text, pos):
+            if token == '"':
+                pending, start = text[col - 1:], (line_no, col)
+                break
+            yield token, line_no, col
+    if pending is not None:
+        raise UnterminatedStringError()
+
+
+def line_tokens(text, pos):
+    """Tokens of one line up to a comment; a lone ``"`` opens a string that goes on past the line."""
+    for match in TOKEN_RE.finditer(text, pos):
+        if match.group() == ";":
+            return
+        yield match.group(), match.start() + 1
+
+
+def source_lines(source):
+    return io.StringIO(source) if isinstance(source, str) else source
+
+
+def tokenize_with_positions(code):
+    return list(lex(source_lines(code)))
+
+
 def tokenize(code):
-    lines = code.splitlines()
-    no_comments = [re.sub(r";.*$", "", line) for line in lines]
-    code_nc = "\n".join(no_comments)
-
-    token_pattern = r""""([^"\\]*(\\.[^"\\]*)*)"|[\(\)]|[^\s\(\)]+"""
-    tokens = []
-    for match in re.finditer(token_pattern, code_nc):
-        if match.group(1) is not None:
-            tokens.append('"' + match.group(1) + '"')
-        else:
-            tokens.append(match.group(0))
-    return tokens
+    return [token for token, _, _ in lex(source_lines(code))]
 
 
-class LispParser:
-    def __init__(self, source_code):
-        self.tokens = tokenize(source_code)
-        self.pos = 0
-
-    def parse(self):
-        if self.tokens[self.pos] == "(":
-            self.pos += 1
-            lst = []
-            while self.tokens[self.pos] != ")":
-                lst.append(self.parse())
-            self.pos += 1
-            return lst
-        return self.atom(self.tokens[self.pos])
-
-    def atom(self, token):
-        self.pos += 1
-        if token.startswith('"') and token.endswith('"'):
-            return {"type": "string", "value": token[1:-1].replace("\\n", "\n").replace("\\t", "\t")}
-        if token.startswith("[") and token.endswith("]"):
-            try:
-                size = int(token[1:-1])
-            except ValueError:
-                return token
-            else:
-                return {"string_size": size}
+class Form(list[object]):
+    """Parsed list that remembers where it is in the source: ``(line, col, end_line, end_col)``."""
+
+    span: tuple[int, int, int, int] | None = None
+
+
+def atom(token):
+    if token.startswith('"') and token.endswith('"'):
+        return {"type": "string", "value": token[1:-1].replace("\\n", "\n").replace("\\t", "\t")}
+    if token.startswith("[") and token.endswith("]"):
         try:
-            return int(token)
+            size = int(token[1:-1])
         except ValueError:
             return token
+        else:
+            return {"string_size": size}
+    # int() only succeeds on a sign or a digit, so names skip the exception
+    if token[0] not in "+-0123456789":
+        return token
+    try:
+        return int(token)
+    except ValueError:
+        return token
+
+
+class LispParser:
+    """Parser over a source string or a text stream (e.g. an open file), read line by line."""
+
+    def __init__(self, source):
+        self.tokens = lex(source_lines(source))
+
+    def forms(self):
+        """Yield top-level forms one at a time; nesting is kept on an explicit stack, not the call stack."""
+        stack: list[tuple[Form, int, int]] = []
+        for token, line, col in self.tokens:
+            if token == "(":
+                stack.append((Form(), line, col))
+                continue
+            if token == ")":
+                if not stack:
+                    raise UnbalancedParenthesesError()
+                value, start_line, start_col = stack.pop()
+                value.span = (start_line, start_col, line, col)
+            else:
+                value = atom(token)
+            if stack:
+                stack[-1][0].append(value)
+            else:
+                yield value
+        if stack:
+            raise UnbalancedParenthesesError()
 
     def parse_program(self):
-        program = []
-        while self.pos < len(self.tokens):
-            program.append(self.parse())
-        return program
+        return list(self.forms())
 
 
 def ast_to_expr(ast):
@@ -80,14 +143,20 @@ def ast_to_expr(ast):
     }
 
     if head in ("+", "-", "*", "/", "=", "<", ">"):
-        return _parse_binop(head, args)
+        return _with_span(_parse_binop(head, args), ast)
 
     handler = dispatch.get(head)
     if handler:
-        return handler(args)
+        return _with_span(handler(args), ast)
 
     return None
 
+
+def _with_span(node, form):
+    if isinstance(form, Form) and form.span is not None:
+        node["span"] = form.span
+    return node
+
 def _parse_get(args):
     return {
         "type": "get",
@@ -0,0 +1,9 @@
+import sys
+
+from tracer import decode_file
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python trace_decode.py <trace.bin> <trace.log>")
+        sys.exit(1)
+    decode_file(sys.argv[1], sys.argv[2])
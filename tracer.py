@@ -0,0 +1,92 @@
+import struct
+
+TRACE_LEVELS = ("off", "macro", "full")
+TRACE_FORMATS = ("text", "binary")
+
+TRACE_MAGIC = b"MCTR\x01"
+KIND_STATE = 0
+KIND_FETCH = 1
+# tick, kind, uPC, Z | N << 1, IR, ACC, DR, IP, SP, DataA
+RECORD = struct.Struct("<QBBBIqqqqq")
+
+SEPARATOR = "-" * 40 + "\n"
+
+
+class UnknownTraceError(ValueError):
+    """Trace level or format is not supported by the selected engine."""
+
+
+class InvalidTraceFileError(ValueError):
+    """Binary trace must start with the MCTR header."""
+
+
+def format_fetch(tick, ip, ir):
+    return f"[TICK  {tick} (FETCH)] IP={ip:04} OPCODE={(ir >> 27) & 0x1F:02}\n" + SEPARATOR
+
+
+def format_state(tick, upc, ir, acc, dr, ip, sp, data_a, z, n):
+    return (
+        f"[TICK {tick}] uPC={upc:02} IR={ir:08X}\n"
+        f"ACC={acc:11} DR={dr:11} IP={ip:08X} SP={sp:08X}\n"
+        f"DataA={data_a} Z={z} N={n}\n" + SEPARATOR
+    )
+
+
+class TextTracer:
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def fetch(self, tick, ip, ir):
+        self.file.write(format_fetch(tick, ip, ir))
+
+    def state(self, r):
+        self.file.write(format_state(r.macro_cnt, r.uPC, r.IR, r.ACC, r.DR, r.IP, r.SP, r.DataA, r.Z, r.N))
+
+    def close(self):
+        self.file.close()
+
+
+class BinaryTracer:
+    def __init__(self, path):
+        self.file = open(path, "wb", buffering=1 << 20)
+        self.file.write(TRACE_MAGIC)
+        self.pack = RECORD.pack
+
+    def fetch(self, tick, ip, ir):
+        self.file.write(self.pack(tick, KIND_FETCH, 0, 0, ir, 0, 0, ip, 0, 0))
+
+    def state(self, r):
+        self.file.write(self.pack(r.macro_cnt, KIND_STATE, r.uPC, r.Z | r.N << 1, r.IR,
+                                  r.ACC, r.DR, r.IP, r.SP, r.DataA))
+
+    def close(self):
+        self.file.close()
+
+
+def open_tracer(path, level, trace_format="text"):
+    """Return ``(tracer, fetch_hook, state_hook)``; hooks are None when not traced."""
+    if level not in TRACE_LEVELS or trace_format not in TRACE_FORMATS:
+        raise UnknownTraceError(level, trace_format)
+    if level == "off" or path is None:
+        return None, None, None
+    tracer = BinaryTracer(path) if trace_format == "binary" else TextTracer(path)
+    return tracer, tracer.fetch, tracer.state if level == "full" else None
+
+
+def _render(record):
+    tick, kind, upc, flags, ir, acc, dr, ip, sp, data_a = record
+    if kind == KIND_FETCH:
+        return format_fetch(tick, ip, ir)
+    return format_state(tick, upc, ir, acc, dr, ip, sp, data_a, flags & 1, flags >> 1)
+
+
+def decode_stream(f, chunk_records=4096):
+    if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+        raise InvalidTraceFileError()
+    while chunk := f.read(RECORD.size * chunk_records):
+        yield from map(_render, RECORD.iter_unpack(chunk))
+
+
+def decode_file(bin_path, text_path):
+    with open(bin_path, "rb") as f, open(text_path, "w", encoding="utf-8") as out:
+        out.writelines(decode_stream(f))
@@ -0,0 +1,244 @@
+import io
+import math
+
+import numpy as np
+from cpu_sim import decode_rom
+from data_memory import STACK_LIMIT, STACK_TOP, STATIC_LIMIT, DataMemory, UnmappedAddressError
+from microcode_memory import OPCODE_TO_UADDR, ROM
+from ports import InputPort, OutputPort
+
+MASK = 0xFFFFFFFF
+FIELDS = ("acc_l", "adr_sel", "alu_op", "cla", "cld", "cond", "dal", "dr_l", "halted", "io_sel", "ip_l", "ip_sel",
+          "mem_l", "next_u", "out_l", "sp_l")
+
+
+def decode_rom_table(rom):
+    """Microinstruction fields as a ``(field, uPC)`` table, in ``FIELDS`` order."""
+    micro = decode_rom(rom)
+    return np.array([[getattr(s, name) for s in micro] for name in FIELDS], dtype=np.int8)
+
+
+def alu_columns(op, left, right):
+    """``ALU_OPS`` over whole columns; int64 wraps modulo 2**64, so the low 32 bits come out as in ``CPU``."""
+    result = left + right
+    result += op == 4
+    result -= op == 5
+    for code, ufunc in ((1, np.subtract), (2, np.multiply)):
+        selected = op == code
+        if selected.any():
+            ufunc(left, right, out=result, where=selected)
+    selected = op == 3
+    if selected.any():
+        quotient = left // np.where(right == 0, 1, right)
+        np.copyto(result, np.where(right == 0, 0, quotient), where=selected)
+    np.copyto(result, 0, where=op > 5)
+    return result & MASK
+
+
+def grow(segment, size, limit):
+    """Widen every instance's segment to at least ``size`` cells (doubling, up to ``limit``)."""
+    if size <= segment.shape[1]:
+        return segment
+    wider = np.zeros((segment.shape[0], min(limit, max(size, 2 * segment.shape[1], 16))), dtype=np.int64)
+    wider[:, :segment.shape[1]] = segment
+    return wider
+
+
+class VectorMemory:
+    """``DataMemory`` of every instance as two 2-D arrays, one row per instance.
+
+    Columns of ``static`` are addresses, columns of ``stack`` are ``STACK_TOP - addr``; both
+    grow on write for all rows at once.
+    """
+
+    def __init__(self, image, count):
+        self.static = np.tile(np.array(image.static, dtype=np.int64), (count, 1))
+        self.stack = np.tile(np.array(image.stack, dtype=np.int64), (count, 1))
+
+    def read(self, rows, addrs):
+        values = np.zeros(len(rows), dtype=np.int64)
+        hit = (addrs >= 0) & (addrs < self.static.shape[1])
+        values[hit] = self.static[rows[hit], addrs[hit]]
+        idx = STACK_TOP - addrs
+        hit = (idx >= 0) & (idx < self.stack.shape[1])
+        values[hit] = self.stack[rows[hit], idx[hit]]
+        return values
+
+    def write(self, rows, addrs, values):
+        """Store ``values``; return the mask of writes outside both segments."""
+        static = (addrs >= 0) & (addrs < STATIC_LIMIT)
+        idx = STACK_TOP - addrs
+        stack = ~static & (idx >= 0) & (idx < STACK_LIMIT)
+        if static.any():
+            self.static = grow(self.static, int(addrs[static].max()) + 1, STATIC_LIMIT)
+            self.static[rows[static], addrs[static]] = values[static]
+        if stack.any():
+            self.stack = grow(self.stack, int(idx[stack].max()) + 1, STACK_LIMIT)
+            self.stack[rows[stack], idx[stack]] = values[stack]
+        return ~(static | stack)
+
+
+class VectorRegisters:
+    """``Registers`` of every instance, one column each."""
+
+    def __init__(self, count):
+        def column(value=0):
+            return np.full(count, value, dtype=np.int64)
+
+        self.ACC = column()
+        self.SP = column(STACK_TOP)
+        self.IP = column()
+        self.DR = column()
+        self.DataA = column()
+        self.uPC = column()
+        self.IR = column()
+        self.Z = column()
+        self.N = column()
+        self.ARG = column()
+        self.halted = np.zeros(count, dtype=bool)
+        self.macro_cnt = column()
+
+
+def open_input(path):
+    """Input of one instance, read up front so that thousands of instances don't keep files open."""
+    if path is None:
+        return InputPort()
+    with open(path, encoding="utf-8") as f:
+        return InputPort(stream=io.StringIO(f.read()))
+
+
+class VectorCPU:
+    """One binary run for many inputs in lockstep: every global step is one tick of each running instance.
+
+    Instances sit at different points of the program; each step decodes every instance's own
+    microinstruction by gathering its row of the ``ROM`` table at its uPC and applies the latches
+    under masks, so halted instances and those waiting for a fetch are left as they are.
+    IN and OUT go through per-instance ports. An instance whose input can't be opened or that
+    writes outside the data segments stops alone; the exception is kept in ``errors``.
+    Ticks, outputs and the final machine state match separate ``CPU`` runs.
+    """
+
+    def __init__(self, instr_mem, data_mem, input_paths):
+        count = len(input_paths)
+        self.table = decode_rom_table(ROM)
+        words = np.array(instr_mem, dtype=np.int64)
+        args = words & 0x07FFFFFF
+        self.args = np.where(args & (1 << 26), args - (1 << 27), args)
+        self.uaddr = np.array(OPCODE_TO_UADDR, dtype=np.int64)[(words >> 27) & 0x1F]
+        self.words = words
+
+        self.registers = VectorRegisters(count)
+        image = data_mem if isinstance(data_mem, DataMemory) else DataMemory(data_mem)
+        self.memory = VectorMemory(image, count)
+        self.fetch_pending = np.ones(count, dtype=bool)
+        self.errors: dict[int, Exception] = {}
+        self.timed_out = np.zeros(count, dtype=bool)
+        self.out_ports = [OutputPort(echo=False) for _ in range(count)]
+        self.in_ports = []
+        for row, path in enumerate(input_paths):
+            try:
+                self.in_ports.append(open_input(path))
+            except OSError as e:
+                self.in_ports.append(InputPort())
+                self.fail(row, e)
+
+    def fail(self, row, error):
+        self.errors[row] = error
+        self.registers.halted[row] = True
+
+    def fetch(self, mask):
+        r = self.registers
+        np.copyto(self.fetch_pending, False, where=mask)
+        past = mask & (r.IP >= len(self.words))
+        r.halted |= past
+        if not len(self.words):
+            return
+        fetched = mask & ~past
+        ip = np.minimum(r.IP, len(self.words) - 1)
+        np.copyto(r.IR, self.words[ip], where=fetched)
+        np.copyto(r.ARG, self.args[ip], where=fetched)
+        np.copyto(r.uPC, self.uaddr[ip], where=fetched)
+        r.macro_cnt += fetched
+
+    def micro_step(self, mask):
+        r = self.registers
+        s = dict(zip(FIELDS, self.table.take(r.uPC, axis=1), strict=True))
+        left = np.where(s["cla"] == 1, r.ACC, np.where(s["cla"] == 2, r.SP, 0))
+        right = np.where(s["cld"] == 1, r.DR, np.where(s["cld"] == 2, r.IP, np.where(s["cld"] == 3, r.ARG, 0)))
+        alu = alu_columns(s["alu_op"], left, right)
+        self._update_acc(mask, s, alu)
+        self._update_memory_access(mask, s, alu)
+        self._update_sp_ip_out(mask, s, alu)
+        self._update_flags_and_branch(mask, s)
+
+    def _read_input(self, row):
+        r = self.registers
+        ch = self.in_ports[row].read()
+        if ch is None:
+            r.halted[row] = True
+        else:
+            r.ACC[row] = ch
+
+    def _update_acc(self, mask, s, alu):
+        r = self.registers
+        latch = mask & (s["acc_l"] == 1)
+        io_sel = latch & (s["io_sel"] == 1)
+        np.copyto(r.ACC, alu, where=latch & ~io_sel)
+        for row in np.flatnonzero(io_sel):
+            self._read_input(row)
+        np.copyto(r.Z, r.ACC == 0, where=latch)
+        np.copyto(r.N, (r.ACC >> 31) & 1, where=latch)
+
+    def _update_memory_access(self, mask, s, alu):
+        r = self.registers
+        np.copyto(r.DataA, np.where(s["adr_sel"] == 1, r.ARG, alu), where=mask & (s["dal"] == 1))
+        stored = np.flatnonzero(mask & (s["mem_l"] == 1))
+        if len(stored):
+            unmapped = self.memory.write(stored, r.DataA[stored], r.ACC[stored] & MASK)
+            for row in stored[unmapped]:
+                self.fail(row, UnmappedAddressError(int(r.DataA[row])))
+        loaded = np.flatnonzero(mask & (s["dr_l"] == 1))
+        if len(loaded):
+            r.DR[loaded] = self.memory.read(loaded, r.DataA[loaded])
+
+    def _update_sp_ip_out(self, mask, s, alu):
+        r = self.registers
+        np.copyto(r.SP, alu, where=mask & (s["sp_l"] == 1))
+        for row in np.flatnonzero(mask & (s["out_l"] == 1)):
+            self.out_ports[row].write(int(r.ACC[row]))
+        np.copyto(r.IP, np.where(s["ip_sel"] == 0, alu, r.ARG), where=mask & (s["ip_l"] == 1))
+
+    def _update_flags_and_branch(self, mask, s):
+        r = self.registers
+        cond, z, n = s["cond"], r.Z, r.N
+        taken = ((cond == 0b001) | ((cond == 0b010) & (z == 1)) | ((cond == 0b011) & (n == 1) & (z != 0))
+                 | ((cond == 0b100) & (z == 0)) | ((cond == 0b101) & (n == 0) & (z != 0)))
+        r.macro_cnt += mask
+        r.halted |= mask & (s["halted"] == 1)
+        next_upc = np.where(taken, s["next_u"], (r.uPC + 1) & 0x7F)
+        np.copyto(self.fetch_pending, (next_upc == 0) & ~r.halted & (r.uPC != 0), where=mask)
+        np.copyto(r.uPC, next_upc, where=mask)
+
+    def step(self):
+        """One tick of every running instance: a fetch or one microinstruction."""
+        running = ~self.registers.halted
+        fetching = running & self.fetch_pending
+        stepping = running & ~self.fetch_pending
+        if stepping.any():
+            self.micro_step(stepping)
+        if fetching.any():
+            self.fetch(fetching)
+
+    def run(self, limit=math.inf):
+        """Run every instance to HALT; one still running at ``limit`` ticks is stopped and marked in ``timed_out``."""
+        r = self.registers
+        while not r.halted.all():
+            self.step()
+            if limit != math.inf:
+                over = ~r.halted & (r.macro_cnt >= limit)
+                self.timed_out |= over
+                r.halted |= over
+
+    @property
+    def output_buffers(self):
+        return [port.values for port in self.out_ports]